@@ -3,7 +3,10 @@ from streamlit_gsheets import GSheetsConnection
 import pandas as pd
 from datetime import datetime, date
 import calendar
+import threading
+import gspread
 import plotly.express as px
+from core.schedule_index import ScheduleMonthIndex, MONTH_LABEL
 
 st.set_page_config(page_title="セット管理Pro", layout="centered")
 
@@ -81,6 +84,82 @@ def load_all_data():
     l = conn.read(worksheet="climbing_logs", ttl=10)
     return m, s, l
 
+# --- 追記専用の書き込み（シート全体を書き直さない） ---
+class SheetAppendBuffer:
+    """
+    ワークシートごとに追加行をためて、flush でまとめて1回の append_rows で送る。
+    flush 中に他のセッションが追加した行は、次の flush で1回にまとめて送られる。
+    書き込みに失敗したワークシートの行は戻さずに例外を投げる（画面で保存し直してもらう）。
+    open_spreadsheet() は追記に使う gspread の Spreadsheet を返す関数。
+    """
+    def __init__(self, conn, open_spreadsheet):
+        self.conn = conn
+        self.open_spreadsheet = open_spreadsheet
+        self._pending = {}  # worksheet -> (既存シートのDataFrame, [追加行dict])
+        self._buf_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def add(self, worksheet, existing_df, rows):
+        with self._buf_lock:
+            _, pending = self._pending.get(worksheet, (None, []))
+            self._pending[worksheet] = (existing_df, pending + list(rows))
+
+    def flush(self):
+        with self._flush_lock:
+            with self._buf_lock:
+                pending, self._pending = self._pending, {}
+            items = list(pending.items())
+            for i, (worksheet, (existing_df, rows)) in enumerate(items):
+                try:
+                    self._write(worksheet, existing_df, rows)
+                except Exception:
+                    # まだ書いていないワークシートの行は戻す（次の flush で送る）。
+                    # 失敗した行は戻さない（エラーを見て保存し直すので、戻すと二重に書かれる）
+                    self._restore(items[i + 1:])
+                    raise
+
+    def _restore(self, items):
+        # 戻す行は、flush 中に追加された行より前に並べる
+        with self._buf_lock:
+            for worksheet, (existing_df, rows) in items:
+                newer_df, newer = self._pending.get(worksheet, (existing_df, []))
+                self._pending[worksheet] = (newer_df, rows + newer)
+
+    def _write(self, worksheet, existing_df, rows):
+        columns = list(existing_df.columns)
+        if existing_df.empty or any(k not in columns for r in rows for k in r):
+            # ヘッダーがまだない / 新しい列がある場合だけシート全体を書き直す
+            self.conn.update(worksheet=worksheet, data=pd.concat([existing_df, pd.DataFrame(rows)], ignore_index=True))
+            return
+        values = [["" if pd.isna(r.get(c)) else r.get(c) for c in columns] for r in rows]
+        self.open_spreadsheet().worksheet(worksheet).append_rows(values, value_input_option="USER_ENTERED")
+
+@st.cache_resource
+def get_spreadsheet():
+    # GSheetsConnection には追記の API がないので、同じ接続設定（secrets）で gspread を直接使う
+    secrets = dict(st.secrets["connections"]["gsheets"])
+    spreadsheet = secrets.pop("spreadsheet")
+    secrets.pop("worksheet", None)
+    client = gspread.service_account_from_dict(secrets)
+    return client.open_by_url(spreadsheet) if spreadsheet.startswith("http") else client.open(spreadsheet)
+
+@st.cache_resource
+def get_append_buffer():
+    return SheetAppendBuffer(conn, get_spreadsheet)
+
+def append_rows(worksheet, existing_df, rows):
+    buf = get_append_buffer()
+    buf.add(worksheet, existing_df, rows)
+    buf.flush()
+
+@st.cache_resource(max_entries=2)
+def get_schedule_month_index(schedule_df):
+    # 引数のハッシュ（シートの中身）が変わったときだけ作り直す。全セッションで共有
+    return ScheduleMonthIndex(schedule_df.assign(
+        start_date=pd.to_datetime(schedule_df['start_date']),
+        end_date=pd.to_datetime(schedule_df['end_date']),
+    ))
+
 try:
     master_df, schedule_df, log_df = load_all_data()
 except:
@@ -109,19 +188,19 @@ with tab1:
             if st.form_submit_button("保存"):
                 if sel_gym != "(選択)":
                     new_rows = [{"gym_name": sel_gym, "start_date": st.session_state[f"s_date_{j}"].isoformat(), "end_date": st.session_state[f"e_date_{j}"].isoformat(), "post_url": p_url} for j in range(st.session_state.date_count)]
-                    conn.update(worksheet="schedules", data=pd.concat([schedule_df, pd.DataFrame(new_rows)], ignore_index=True))
+                    append_rows("schedules", schedule_df, new_rows)
                     st.session_state.date_count = 1; st.rerun()
         if st.button("＋ 日程を増やす"):
             st.session_state.date_count += 1; st.rerun()
 
     if not schedule_df.empty:
-        s_df = schedule_df.copy(); s_df['start_date'] = pd.to_datetime(s_df['start_date']); s_df['end_date'] = pd.to_datetime(s_df['end_date'])
-        s_df['month_year'] = s_df['start_date'].dt.strftime('%Y年%m月')
-        months = sorted(s_df['month_year'].unique().tolist(), reverse=True)
+        month_index = get_schedule_month_index(schedule_df)
+        months = [MONTH_LABEL.format(y, m) for y, m in month_index.months()]
         cur_m = datetime.now().strftime('%Y年%m月')
         sel_m = st.selectbox("表示月", options=months, index=months.index(cur_m) if cur_m in months else 0)
         
-        for _, row in s_df[s_df['month_year'] == sel_m].sort_values('start_date').iterrows():
+        sel_y, sel_mo = map(int, sel_m.rstrip('月').split('年'))
+        for _, row in month_index.rows(sel_y, sel_mo).iterrows():
             is_past = row['end_date'].date() < date.today()
             d_s, d_e = row['start_date'].strftime('%m/%d'), row['end_date'].strftime('%m/%d')
             d_disp = d_s if d_s == d_e else f"{d_s}-{d_e}"
@@ -144,7 +223,7 @@ with tab2:
             l_gym = st.selectbox("ジムを選択", options=["(選択)"] + sorted_gyms)
             if st.form_submit_button("保存"):
                 if l_gym != "(選択)":
-                    conn.update(worksheet="climbing_logs", data=pd.concat([log_df, pd.DataFrame([{"date": l_date.isoformat(), "gym_name": l_gym}])], ignore_index=True))
+                    append_rows("climbing_logs", log_df, [{"date": l_date.isoformat(), "gym_name": l_gym}])
                     st.session_state.last_log = f"{l_date.strftime('%m/%d')} @ {l_gym}"
                     st.rerun()
 
@@ -155,7 +234,7 @@ with tab2:
         with c1: start_q = st.date_input("開始", value=first_day)
         with c2: end_q = st.date_input("終了", value=last_day)
         
-        df_l = log_df.copy(); df_l['date'] = pd.to_datetime(df_l['date'])
+        df_l = log_df.assign(date=pd.to_datetime(log_df['date']))
         disp_df = df_l[(df_l['date'].dt.date >= start_q) & (df_l['date'].dt.date <= end_q)]
         
         if not disp_df.empty:
@@ -231,11 +310,11 @@ with tab3:
             n = st.text_input("ジム名"); u = st.text_input("Instagram URL")
             if st.form_submit_button("登録"):
                 if n and u:
-                    conn.update(worksheet="gym_master", data=pd.concat([master_df, pd.DataFrame([{"gym_name": n, "profile_url": u}])], ignore_index=True))
+                    append_rows("gym_master", master_df, [{"gym_name": n, "profile_url": u}])
                     st.rerun()
     last_v = {}
     if not log_df.empty:
-        df_v = log_df.copy(); df_v['date'] = pd.to_datetime(df_v['date'])
+        df_v = log_df.assign(date=pd.to_datetime(log_df['date']))
         last_v = df_v.groupby('gym_name')['date'].max().dt.strftime('%Y/%m/%d').to_dict()
     for gym in sorted_gyms:
         url = master_df[master_df['gym_name'] == gym]['profile_url'].iloc[0]
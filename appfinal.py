@@ -1,6 +1,8 @@
 import streamlit as st
 from utils import apply_common_style
 from utils import get_supabase_data
+from utils import check_pending_writes
+from core import profiler
 
 from streamlit_option_menu import option_menu
 import pages.home as home
@@ -32,7 +34,8 @@ if "USER" not in st.session_state:
 # --- 2. ログイン判定による分岐 ---
 if st.session_state.USER is None:
     # A. ログイン前：メニューを表示せず、即座に home.py のログイン画面を表示
-    home.show_page()
+    with profiler.page("login"):
+        home.show_page()
 
 else:
     # B. ログイン後：ここで初めてメニューを表示する
@@ -70,17 +73,18 @@ else:
                 "nav-link-selected": {"background-color": "#FF512F"},
             }
         )
-    # 選択されたページを呼び出す
-    if selected == "トップ":
-        home.show_page()
-    elif selected == "ログ":
-        dashboard.show_page()
-    elif selected == "ジム":
-        gyms.show_page()
-    elif selected == "セット":
-        set.show_page()
-    elif selected == "管理":
-        admin.show_page()
+    # 選択されたページを呼び出す（計測が有効なら段階ごとの時間を記録）
+    with profiler.page(selected):
+        if selected == "トップ":
+            home.show_page()
+        elif selected == "ログ":
+            dashboard.show_page()
+        elif selected == "ジム":
+            gyms.show_page()
+        elif selected == "セット":
+            set.show_page()
+        elif selected == "管理":
+            admin.show_page()
 
 st.write("") 
 st.write("")
@@ -91,3 +95,5 @@ st.markdown('<div style="margin-bottom: 100px;"></div>', unsafe_allow_html=True)
 if "toast_msg" in st.session_state:
     st.toast(st.session_state.toast_msg)
     del st.session_state.toast_msg
+# 裏で続いていた書き込みが失敗していたら知らせる
+check_pending_writes()
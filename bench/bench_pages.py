@@ -0,0 +1,201 @@
+"""
+各ページのデータ準備〜描画のベンチマーク（ブラウザなし）。
+bench.synthetic の合成データを FakeSupabase 経由で読ませ、Streamlit の AppTest で
+show_page を実行して、core.profiler の段階ごとの時間とメモリのピークを集計する。
+各ページはキャッシュを空にした1回目（cold）と、そのままの2回目（warm）を計測する。
+
+実行:
+  python -m bench.bench_pages                      # 既定の規模（ログ5万行）で計測して表示
+  python -m bench.bench_pages --logs 1000000       # 規模を変える
+  python -m bench.bench_pages --record             # 結果をベースラインとして保存
+  python -m bench.bench_pages --check              # ベースラインより遅く/重くなっていたら終了コード1
+  python -m bench.bench_pages --backend sqlite     # utils.DATA_BACKEND を切り替えて計測（local は合成データをSQLiteに入れて読む）
+
+ベースラインはマシンに依存するので、比較する前に同じマシンで --record しておくこと。
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+from streamlit.testing.v1 import AppTest
+import streamlit as st
+import utils
+from core import profiler
+from bench.synthetic import make_tables, FakeSupabase
+from core.local_store import LocalStore
+
+PAGES = ["home", "gyms", "dashboard", "friends", "set"]
+BACKENDS = ["supabase", "sqlite", "local"]
+KINDS = ("fetch", "transform", "render")
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline_pages.json")
+
+# 回帰とみなす閾値（ベースライン × 倍率 + 余裕）。小さい値の揺れで落ちないように余裕を足す
+TIME_TOLERANCE, TIME_SLACK_MS = 1.5, 20.0
+MEM_TOLERANCE, MEM_SLACK_KB = 1.3, 1024.0
+
+_SCRIPT = """
+import streamlit as st
+from core import profiler
+import pages.{page} as page
+st.session_state.USER = {user!r}
+st.session_state.U_COLOR = "#FF512F"
+st.session_state.U_ICON = "🐵"
+with profiler.page({page!r}):
+    page.show_page()
+"""
+
+
+def run_page(page, user, timeout):
+    """ページを1回実行して、その計測結果（PageTrace）を返す"""
+    profiler.clear()
+    at = AppTest.from_string(_SCRIPT.format(page=page, user=user), default_timeout=timeout).run()
+    errors = [e.value for e in at.exception]
+    if errors:
+        raise RuntimeError(f"{page}: {errors[0]}")
+    return profiler.recent_traces()[0]
+
+
+def _reset_caches():
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+
+def use_backend(backend, tables, db_dir):
+    """
+    utils.DATA_BACKEND を切り替える。sqlite / local のSQLiteファイルは db_dir に置く
+    （cold でもファイルは残るので、sqlite の cold は「前回の控えから起動」の計測になる）。
+    """
+    utils.DATA_BACKEND = backend
+    utils.LOCAL_DB_PATH = os.path.join(db_dir, f"{backend}.db")
+    if backend == "local":
+        store = LocalStore(utils.LOCAL_DB_PATH)
+        for name, df in tables.items():
+            store.replace(name, df)
+
+
+def measure(tables, pages, memory, timeout):
+    """
+    ページごとに cold / warm を計測する。memory=True なら tracemalloc を有効にして
+    段階ごとのメモリのピークも取る（時間は tracemalloc の分だけ遅くなるので別に計る）。
+    戻り値: {"home/cold": PageTrace, ...}
+    """
+    client = FakeSupabase(tables)
+    utils.init_connection = lambda: client
+    user = tables['users']['user_name'].iloc[0]
+    if memory:
+        tracemalloc.start()
+    try:
+        traces = {}
+        for page in pages:
+            _reset_caches()
+            traces[f"{page}/cold"] = run_page(page, user, timeout)
+            traces[f"{page}/warm"] = run_page(page, user, timeout)
+        return traces
+    finally:
+        if memory:
+            tracemalloc.stop()
+
+
+def summarize(timed, traced):
+    """計測結果を {"home/cold": {"total_ms":…, "fetch_ms":…, …, "peak_kb":…, "stages": {...}}} にまとめる"""
+    result = {}
+    for key, trace in timed.items():
+        row = {"total_ms": round(trace.seconds * 1000, 2)}
+        for kind in KINDS:
+            row[f"{kind}_ms"] = round(sum(s.seconds for s in trace.stages if s.kind == kind) * 1000, 2)
+        peaks = [s.peak_bytes for s in traced[key].stages if s.peak_bytes is not None] if traced else []
+        row["peak_kb"] = round(max(peaks) / 1024, 1) if peaks else None
+        row["stages"] = {
+            s.name: {"kind": s.kind, "ms": round(s.seconds * 1000, 2), "rows": s.rows}
+            for s in trace.stages
+        }
+        result[key] = row
+    return result
+
+
+def print_report(summary):
+    print(f"{'page/run':<16}{'total':>10}{'fetch':>10}{'transform':>11}{'render':>9}{'peak':>12}")
+    for key, row in summary.items():
+        peak = "-" if row["peak_kb"] is None else f"{row['peak_kb'] / 1024:.1f} MB"
+        print(f"{key:<16}{row['total_ms']:>8.1f}ms{row['fetch_ms']:>8.1f}ms{row['transform_ms']:>9.1f}ms"
+              f"{row['render_ms']:>7.1f}ms{peak:>12}")
+        slowest = sorted(row["stages"].items(), key=lambda kv: -kv[1]["ms"])[:3]
+        for name, s in slowest:
+            print(f"    {s['ms']:>8.1f}ms  {s['kind']:<9} {name} ({s['rows']} rows)")
+
+
+def find_regressions(summary, baseline):
+    """ベースラインより悪化した項目のリスト（ページ×cold/warm ごとの合計・種別ごとの時間とメモリのピーク）"""
+    problems = []
+    for key, row in summary.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for col in ["total_ms"] + [f"{kind}_ms" for kind in KINDS]:
+            limit = base[col] * TIME_TOLERANCE + TIME_SLACK_MS
+            if row[col] > limit:
+                problems.append(f"{key} {col}: {row[col]:.1f} > {limit:.1f} (baseline {base[col]:.1f})")
+        if row["peak_kb"] is not None and base.get("peak_kb") is not None:
+            limit = base["peak_kb"] * MEM_TOLERANCE + MEM_SLACK_KB
+            if row["peak_kb"] > limit:
+                problems.append(f"{key} peak_kb: {row['peak_kb']:.0f} > {limit:.0f} (baseline {base['peak_kb']:.0f})")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logs", type=int, default=50_000, help="climbing_logs の行数")
+    parser.add_argument("--gyms", type=int, default=300)
+    parser.add_argument("--users", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pages", nargs="+", default=PAGES, choices=PAGES)
+    parser.add_argument("--backend", default="supabase", choices=BACKENDS, help="utils.DATA_BACKEND")
+    parser.add_argument("--no-memory", action="store_true", help="メモリのピークを計測しない")
+    parser.add_argument("--record", action="store_true", help="結果をベースラインとして保存する")
+    parser.add_argument("--check", action="store_true", help="ベースラインと比較し、悪化していれば終了コード1")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args(argv)
+
+    tables = make_tables(n_logs=args.logs, n_gyms=args.gyms, n_users=args.users, seed=args.seed)
+    scale = f"logs={args.logs},gyms={args.gyms},users={args.users},seed={args.seed}"
+    if args.backend != "supabase":
+        scale += f",backend={args.backend}"
+    print(f"scale: {scale}")
+
+    profiler.set_enabled(True)
+    with tempfile.TemporaryDirectory() as db_dir:
+        use_backend(args.backend, tables, db_dir)
+        timed = measure(tables, args.pages, memory=False, timeout=args.timeout)
+        traced = None if args.no_memory else measure(tables, args.pages, memory=True, timeout=args.timeout)
+    summary = summarize(timed, traced)
+    print_report(summary)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baselines = json.load(f)
+
+    if args.record:
+        baselines[scale] = {k: {c: v for c, v in row.items() if c != "stages"} for k, row in summary.items()}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"baseline recorded: {args.baseline}")
+
+    if args.check:
+        if scale not in baselines:
+            print(f"no baseline for {scale} (run with --record first)")
+            return 1
+        problems = find_regressions(summary, baselines[scale])
+        for p in problems:
+            print(f"REGRESSION {p}")
+        if problems:
+            return 1
+        print("no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
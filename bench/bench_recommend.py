@@ -0,0 +1,49 @@
+"""
+おすすめジムのスコアリングのベンチマーク（1,000ジム × 1,000,000ログの合成データ）
+実行: python -m bench.bench_recommend
+"""
+import time
+import numpy as np
+import pandas as pd
+from core.recommend import recommend_gyms
+
+
+def make_data(n_gyms=1_000, n_logs=1_000_000, n_scheds=20_000, n_users=200, seed=0):
+    rng = np.random.default_rng(seed)
+    base = pd.Timestamp("2024-01-01")
+    gyms = [f"gym_{i}" for i in range(n_gyms)]
+    users = [f"user_{i}" for i in range(n_users)]
+    gym_df = pd.DataFrame({
+        'gym_name': gyms,
+        'area_tag': rng.choice(['新宿', '渋谷', '横浜', '大阪'], n_gyms),
+        'profile_url': [f"https://www.instagram.com/{g}/" for g in gyms],
+    })
+    sched_start = base + pd.to_timedelta(rng.integers(0, 730, n_scheds), unit='D')
+    sched_df = pd.DataFrame({
+        'gym_name': rng.choice(gyms, n_scheds),
+        'start_date': sched_start,
+        'end_date': sched_start + pd.to_timedelta(rng.integers(0, 3, n_scheds), unit='D'),
+    })
+    log_df = pd.DataFrame({
+        'gym_name': rng.choice(gyms, n_logs),
+        'user': rng.choice(users, n_logs),
+        'type': rng.choice(['予定', '実績'], n_logs),
+        'date': base + pd.to_timedelta(rng.integers(0, 730, n_logs), unit='D'),
+    })
+    return gym_df, sched_df, log_df
+
+
+def main(repeat=5):
+    gym_df, sched_df, log_df = make_data()
+    target = pd.Timestamp("2025-06-01")
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        top = recommend_gyms(gym_df, sched_df, log_df, "user_0", target, allowed_tags=['新宿', '渋谷'])
+        times.append(time.perf_counter() - t0)
+    print(top[['gym_name', 'score', 'reasons']].to_string(index=False))
+    print(f"recommend_gyms: best {min(times) * 1000:.1f} ms / median {sorted(times)[len(times) // 2] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+セット日パーサーの精度とスループットのベンチマーク
+精度: bench/schedule_corpus.json（キャプション + 正解の (開始, 終了)）
+速度: コーパスを水増しした数千件のキャプションを parse_captions に一括で渡す
+実行: python -m bench.bench_schedule_parser
+"""
+import json
+import os
+import time
+from datetime import date
+from schedule_parser import parse_captions
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "schedule_corpus.json")
+MIN_CONFIDENCE = 0.5
+
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path, encoding="utf-8") as f:
+        corpus = json.load(f)
+    today = date.fromisoformat(corpus['today'])
+    texts = [c['text'] for c in corpus['captions']]
+    expected = {(i, s, e) for i, c in enumerate(corpus['captions']) for s, e in c['expected']}
+    return today, texts, expected
+
+
+def accuracy(today, texts, expected, min_confidence=MIN_CONFIDENCE):
+    found = {(r.caption_index, r.start.isoformat(), r.end.isoformat())
+             for r in parse_captions(texts, today=today, min_confidence=min_confidence)}
+    hit = len(found & expected)
+    precision = hit / len(found) if found else 1.0
+    recall = hit / len(expected) if expected else 1.0
+    return precision, recall, sorted(found - expected), sorted(expected - found)
+
+
+def main(n_captions=5_000, repeat=5):
+    today, texts, expected = load_corpus()
+    precision, recall, extra, missed = accuracy(today, texts, expected)
+    print(f"accuracy: precision {precision:.2f} / recall {recall:.2f} ({len(texts)} captions)")
+    for i, s, e in extra:
+        print(f"  extra : {s}〜{e}  {texts[i]}")
+    for i, s, e in missed:
+        print(f"  missed: {s}〜{e}  {texts[i]}")
+
+    batch = (texts * (n_captions // len(texts) + 1))[:n_captions]
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        parse_captions(batch, today=today, min_confidence=MIN_CONFIDENCE)
+        times.append(time.perf_counter() - t0)
+    best = min(times)
+    print(f"parse_captions: {n_captions} captions best {best * 1000:.1f} ms ({n_captions / best:,.0f} captions/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+ベンチマーク用の合成データと、それを返すだけの Supabase クライアントの代役。
+make_tables で users / area_master / gym_master / set_schedules / climbing_logs を
+シード固定で作り、FakeSupabase を utils.init_connection の代わりに差し込むと
+get_supabase_data / query_supabase_data / get_tables がそのまま合成データを読む。
+"""
+import numpy as np
+import pandas as pd
+
+AREAS = [
+    ("新宿", "都内・神奈川"), ("渋谷", "都内・神奈川"), ("池袋", "都内・神奈川"), ("横浜", "都内・神奈川"),
+    ("大宮", "関東"), ("千葉", "関東"), ("大阪", "関西"), ("京都", "関西"), ("福岡", "全国"),
+]
+TIME_SLOTS = ["昼", "夕方", "夜", None]
+DATE_COLUMNS = ("date", "start_date", "end_date")
+
+
+def make_tables(n_logs=50_000, n_gyms=300, n_users=30, days=730, seed=0, today=None):
+    """
+    それっぽい分布の5テーブルを作る（日付は today 基準なので、どのページにも表示対象がある）。
+    - ユーザーごとの登る頻度・ジムの人気は偏らせる（一部のユーザー・ジムにログが集中）
+    - 実績は過去 days 日、予定は直近数日前〜3週間先
+    - セットは各ジムでおおよそ3〜5週間おきに1〜3日
+    """
+    rng = np.random.default_rng(seed)
+    today = pd.Timestamp(today or pd.Timestamp.now().normalize())
+
+    users = pd.DataFrame({
+        'id': np.arange(1, n_users + 1),
+        'user_name': [f"user{i:03d}" for i in range(n_users)],
+        'color': [f"#{c:06x}" for c in rng.integers(0, 0xFFFFFF, n_users)],
+        'icon': rng.choice(["🐵", "🦍", "🐨", "🦊", "🐸"], n_users),
+    })
+    area_master = pd.DataFrame({
+        'id': np.arange(1, len(AREAS) + 1),
+        'area_tag': [a for a, _ in AREAS],
+        'major_area': [m for _, m in AREAS],
+    })
+    gym_names = np.array([f"GYM {i:04d}" for i in range(n_gyms)])
+    gym_master = pd.DataFrame({
+        'id': np.arange(1, n_gyms + 1),
+        'gym_name': gym_names,
+        'area_tag': rng.choice(area_master['area_tag'], n_gyms),
+        'profile_url': [f"https://www.instagram.com/gym{i:04d}/" for i in range(n_gyms)],
+        'created_by': rng.choice(users['user_name'], n_gyms),
+    })
+
+    # セット: ジムごとに 3〜5 週間おき
+    interval = rng.integers(21, 36, n_gyms)
+    per_gym = (days + 30) // interval + 1
+    gym_idx = np.repeat(np.arange(n_gyms), per_gym)
+    k = np.arange(len(gym_idx)) - np.repeat(np.cumsum(per_gym) - per_gym, per_gym)
+    offset = rng.integers(0, 35, n_gyms)[gym_idx] + k * interval[gym_idx]
+    start = today - pd.Timedelta(days=days) + pd.to_timedelta(offset, unit='D')
+    keep = start <= today + pd.Timedelta(days=30)
+    start, gym_idx = start[keep], gym_idx[keep]
+    set_schedules = pd.DataFrame({
+        'id': np.arange(1, len(start) + 1),
+        'gym_name': gym_names[gym_idx],
+        'start_date': start,
+        'end_date': start + pd.to_timedelta(rng.integers(0, 3, len(start)), unit='D'),
+        'post_url': "https://www.instagram.com/p/xxxx/",
+    })
+
+    # ログ: ユーザーとジムは Zipf 風の重みで偏らせる
+    user_w = 1 / np.arange(1, n_users + 1) ** 0.8
+    gym_w = 1 / np.arange(1, n_gyms + 1) ** 1.1
+    is_plan = rng.random(n_logs) < 0.3
+    day_offset = np.where(
+        is_plan,
+        rng.integers(-3, 22, n_logs),
+        -rng.integers(0, days, n_logs),
+    )
+    climbing_logs = pd.DataFrame({
+        'id': np.arange(1, n_logs + 1),
+        'date': today + pd.to_timedelta(day_offset, unit='D'),
+        'user': users['user_name'].to_numpy()[rng.choice(n_users, n_logs, p=user_w / user_w.sum())],
+        'gym_name': gym_names[rng.choice(n_gyms, n_logs, p=gym_w / gym_w.sum())],
+        'type': np.where(is_plan, '予定', '実績'),
+        'time_slot': rng.choice(np.array(TIME_SLOTS, dtype=object), n_logs),
+    })
+    return {
+        'users': users,
+        'area_master': area_master,
+        'gym_master': gym_master,
+        'set_schedules': set_schedules,
+        'climbing_logs': climbing_logs,
+    }
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    """select / eq / neq / gt / gte / lte / in_ / order / range だけを pandas で再現するクエリ"""
+
+    def __init__(self, client, name):
+        self._client, self._name = client, name
+        self._columns, self._filters, self._order, self._range = None, [], None, None
+
+    def select(self, columns):
+        self._columns = None if columns == "*" else tuple(c.strip() for c in columns.split(","))
+        return self
+
+    def _add(self, op, col, value):
+        self._filters.append((op, col, tuple(value) if op == "in" else value))
+        return self
+
+    def eq(self, col, value):
+        return self._add("eq", col, value)
+
+    def neq(self, col, value):
+        return self._add("neq", col, value)
+
+    def gt(self, col, value):
+        return self._add("gt", col, value)
+
+    def gte(self, col, value):
+        return self._add("gte", col, value)
+
+    def lte(self, col, value):
+        return self._add("lte", col, value)
+
+    def in_(self, col, values):
+        return self._add("in", col, values)
+
+    def order(self, col):
+        self._order = col
+        return self
+
+    def range(self, start, end):
+        self._range = (start, end)
+        return self
+
+    def execute(self):
+        df = self._client._select(self._name, tuple(self._filters), self._columns, self._order)
+        if self._range:
+            df = df.iloc[self._range[0]: self._range[1] + 1]
+        # Supabase と同じく日付は ISO 文字列で返す
+        out = df.assign(**{c: df[c].dt.strftime("%Y-%m-%d") for c in DATE_COLUMNS if c in df.columns})
+        return _Result(out.to_dict("records"))
+
+
+class FakeSupabase:
+    """
+    読み取り専用の Supabase クライアントの代役（utils.init_connection の差し替え用）。
+    ページングで同じ条件のクエリが続くので、直前の絞り込み結果を使い回す。
+    """
+
+    def __init__(self, tables):
+        self.tables = tables
+        self._last = (None, None)
+
+    def table(self, name):
+        return _Query(self, name)
+
+    def _select(self, name, filters, columns, order):
+        key = (name, filters, columns, order)
+        if self._last[0] == key:
+            return self._last[1]
+        df = self.tables.get(name, pd.DataFrame())
+        for op, col, value in filters:
+            s = df[col]
+            if col in DATE_COLUMNS and op != "in":
+                value = pd.Timestamp(value).tz_localize(None)
+            elif op in ("eq", "neq"):
+                s, value = s.astype(str), str(value)
+            if op == "eq":
+                df = df[s == value]
+            elif op == "neq":
+                df = df[s != value]
+            elif op == "gt":
+                df = df[s > value]
+            elif op == "gte":
+                df = df[s >= value]
+            elif op == "lte":
+                df = df[s <= value]
+            elif op == "in":
+                df = df[s.isin(value)]
+        if order:
+            df = df.sort_values(order, kind="stable")
+        if columns:
+            df = df[list(columns)]
+        self._last = (key, df)
+        return df
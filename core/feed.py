@@ -0,0 +1,45 @@
+from core.profiler import timed
+
+TIME_SLOTS = ["昼", "夕方", "夜"]
+# 時間帯が空（古いデータなど）のユーザーはこのキーにまとめる
+OTHERS = ""
+
+
+@timed()
+def build_plan_feed(plans_df):
+    """
+    「一緒にのぼろー」の表示モデルを作る（Streamlitに依存しない純粋関数）。
+    予定を (日付, ジム, 時間帯) で一度に集計し、時間帯ごとの重複なし・名前順のユーザーリストにする。
+
+    戻り値: [{"date": Timestamp, "gym_name": str, "slots": {"昼": [...], "夕方": [...], "夜": [...]},
+              "others": [...]}, ...]（日付・ジム名順）
+    """
+    if plans_df.empty:
+        return []
+
+    df = plans_df[['date', 'gym_name', 'user']].copy()
+    if 'time_slot' in plans_df.columns:
+        slot = plans_df['time_slot'].astype(object)
+        df['slot'] = slot.where(slot.isin(TIME_SLOTS), OTHERS)
+    else:
+        df['slot'] = OTHERS
+    df['user'] = df['user'].astype(str)
+    df['gym_name'] = df['gym_name'].astype(str)
+
+    users = (
+        df.drop_duplicates()
+        .sort_values(['date', 'gym_name', 'slot', 'user'])
+        .groupby(['date', 'gym_name', 'slot'], sort=False)['user']
+        .agg(list)
+    )
+
+    feed, current = [], None
+    for (d_ts, gym, slot), names in users.items():
+        if current is None or current['date'] != d_ts or current['gym_name'] != gym:
+            current = {"date": d_ts, "gym_name": gym, "slots": {ts: [] for ts in TIME_SLOTS}, "others": []}
+            feed.append(current)
+        if slot == OTHERS:
+            current['others'] = names
+        else:
+            current['slots'][slot] = names
+    return feed
@@ -0,0 +1,238 @@
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from core.schema import SCHEMAS, TableSchema, apply_schema
+
+# 日付は ISO 形式の文字列で持つ（文字列の大小比較がそのまま日付の比較になる）
+_TS_FORMAT = '%Y-%m-%dT%H:%M:%S'
+_DEFAULT = TableSchema()
+
+
+def _quote(name):
+    # "user" のような予約語もカラム名に使えるように必ずクォートする
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _sql_value(col, value, dates):
+    # SQLite に渡せる値にする（欠損は NULL、日付は ISO 文字列、numpy の数値は Python の数値）
+    if pd.api.types.is_scalar(value) and pd.isna(value):
+        return None
+    if col in dates:
+        return pd.Timestamp(value).strftime(_TS_FORMAT)
+    return value.item() if hasattr(value, 'item') else value
+
+
+class LocalStore:
+    """
+    テーブルのローカルミラー（SQLite）。
+    TableMirror のリスナー（listener(name)）として差分同期・書き込みの反映を受け取り、
+    query_supabase_data の絞り込みをインデックスつきの SQL で手元で実行する。
+    fetch_rows / fetch_ids / insert / delete を持つので、Supabase なしでデータの置き場所としても使える。
+    """
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._columns = {}  # テーブル名 -> [カラム名]
+        self._seeded = {}   # テーブル名 -> load で返した DataFrame（同じものでの reset は書き直さない）
+        self._lock = threading.Lock()
+        for (name,) in self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+            self._columns[name] = [r[1] for r in self._conn.execute(f"PRAGMA table_info({_quote(name)})")]
+
+    # --- テーブル定義 ---
+    def _create(self, name, columns):
+        cols = ['id'] + [c for c in columns if c != 'id']
+        defs = ", ".join("id INTEGER PRIMARY KEY" if c == 'id' else _quote(c) for c in cols)
+        self._conn.execute(f"DROP TABLE IF EXISTS {_quote(name)}")
+        self._conn.execute(f"CREATE TABLE {_quote(name)} ({defs})")
+        self._columns[name] = cols
+
+    def _create_indexes(self, name):
+        # まとめて書き込むときは、書き込んだあとに張る方が速い
+        for i, index in enumerate(SCHEMAS.get(name, _DEFAULT).indexes):
+            if all(c in self._columns[name] for c in index):
+                self._conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {_quote(f'{name}_idx{i}')} "
+                    f"ON {_quote(name)} ({', '.join(map(_quote, index))})"
+                )
+
+    def _ensure_columns(self, name, columns):
+        if name not in self._columns:
+            self._create(name, columns)
+            self._create_indexes(name)
+            return
+        for c in columns:
+            if c not in self._columns[name]:
+                self._conn.execute(f"ALTER TABLE {_quote(name)} ADD COLUMN {_quote(c)}")
+                self._columns[name].append(c)
+
+    def _write(self, name, df):
+        # df のカラムのまま INSERT OR REPLACE する（id が同じ行は置き換え）
+        # 値の変換は列ごとにまとめて行う（日付は ISO 文字列、欠損は None）
+        dates = SCHEMAS.get(name, _DEFAULT).dates
+        cols = list(df.columns)
+        values = {}
+        for c in cols:
+            col = df[c]
+            if c in dates:
+                # datetime_as_string は strftime よりずっと速く、_TS_FORMAT と同じ形になる
+                dt = pd.to_datetime(col)
+                if dt.dt.tz is not None:
+                    dt = dt.dt.tz_localize(None)  # apply_schema と同じく、その地域の時刻のまま tz を外す
+                col = pd.Series(np.datetime_as_string(dt.to_numpy('datetime64[s]'), unit='s'), index=col.index).where(dt.notna())
+            col = col.astype(object)
+            values[c] = col.where(col.notna(), None)
+        rows = list(zip(*(values[c] for c in cols)))
+        self._conn.executemany(
+            f"INSERT OR REPLACE INTO {_quote(name)} ({', '.join(map(_quote, cols))}) "
+            f"VALUES ({', '.join('?' * len(cols))})",
+            rows,
+        )
+
+    # --- TableMirror からの通知 ---
+    def listener(self, name):
+        """TableMirror.subscribe に渡すリスナー（name のテーブルの増減をSQLiteに反映する）"""
+        return _Listener(self, name)
+
+    def replace(self, name, df):
+        """テーブルの中身を df で置き換える"""
+        with self._lock:
+            if self._seeded.pop(name, None) is df:
+                return
+            if len(df.columns):
+                self._create(name, list(df.columns))
+                self._write(name, df)
+                self._create_indexes(name)
+            elif name in self._columns:
+                self._conn.execute(f"DELETE FROM {_quote(name)}")
+            self._conn.commit()
+
+    def upsert(self, name, df):
+        if df.empty:
+            return
+        with self._lock:
+            self._ensure_columns(name, list(df.columns))
+            self._write(name, df)
+            self._conn.commit()
+
+    def remove(self, name, ids):
+        ids = [_sql_value('id', i, ()) for i in ids]
+        if not ids or name not in self._columns:
+            return
+        with self._lock:
+            self._conn.executemany(f"DELETE FROM {_quote(name)} WHERE id = ?", [(i,) for i in ids])
+            self._conn.commit()
+
+    # --- 読み出し ---
+    def load(self, name):
+        """保存済みのテーブル全体（型定義を適用済み）。まだ保存したことがなければ None"""
+        if name not in self._columns:
+            return None
+        with self._lock:
+            # 書き込みの完了前に終了したときの仮の行（負の id）は捨てる（書き込めていれば本物の id で同期される）
+            self._conn.execute(f"DELETE FROM {_quote(name)} WHERE id < 0")
+            self._conn.commit()
+        df = self.query(name)
+        with self._lock:
+            self._seeded[name] = df
+        return df
+
+    def query(self, name, columns=(), eq=(), neq=(), gte=(), lte=(), order=None, isin=()):
+        """
+        条件に合う行を DataFrame で返す（query_supabase_data と同じ意味の絞り込み）。
+        eq/neq/gte/lte は ((カラム名, 値), ...)、isin は ((カラム名, [値, ...]), ...)。
+        """
+        cols, rows = self._select(name, columns, eq, neq, gte, lte, order, isin)
+        if not rows:
+            return pd.DataFrame()
+        return apply_schema(pd.DataFrame(rows, columns=cols), name)
+
+    def _select(self, name, columns=(), eq=(), neq=(), gte=(), lte=(), order=None, isin=(), since_id=None):
+        with self._lock:
+            existing = self._columns.get(name)
+            if existing is None:
+                return list(columns), []
+            schema = SCHEMAS.get(name, _DEFAULT)
+            wanted = columns or schema.columns or existing
+            cols = [c for c in wanted if c in existing]
+            where, params = [], []
+            for op, preds in (("=", eq), ("!=", neq), (">=", gte), ("<=", lte)):
+                for col, v in preds:
+                    where.append(f"{_quote(col)} {op} ?")
+                    params.append(_sql_value(col, v, schema.dates))
+            for col, values in isin:
+                values = list(values)
+                where.append(f"{_quote(col)} IN ({', '.join('?' * len(values))})" if values else "0")
+                params.extend(_sql_value(col, v, schema.dates) for v in values)
+            if since_id is not None:
+                where.append("id > ?")
+                params.append(_sql_value('id', since_id, ()))
+            sql = f"SELECT {', '.join(map(_quote, cols))} FROM {_quote(name)}"
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            # 並び順の指定がなければ id 順（インデックスを使うと返る順番が変わるので、Supabase と揃える）
+            order = order or ('id' if 'id' in existing else None)
+            if order:
+                sql += f" ORDER BY {_quote(order)}"
+            return cols, self._conn.execute(sql, params).fetchall()
+
+    # --- データの置き場所として使うとき（TableMirror の fetch_rows / fetch_ids と書き込み） ---
+    def fetch_rows(self, name, since_id=None):
+        cols, rows = self._select(name, since_id=since_id)
+        return [dict(zip(cols, r)) for r in rows]
+
+    def fetch_ids(self, name):
+        return [r[0] for r in self._select(name, columns=('id',))[1]]
+
+    def fetch_by_ids(self, name, ids):
+        cols, rows = self._select(name, isin=(('id', ids),))
+        return [dict(zip(cols, r)) for r in rows]
+
+    def insert(self, name, records):
+        """
+        行を追加して、採番した id つきのレコード（Supabase の insert の res.data 相当）を返す。
+        """
+        if not records:
+            return []
+        dates = SCHEMAS.get(name, _DEFAULT).dates
+        columns = list(dict.fromkeys(c for r in records for c in r if c != 'id'))
+        with self._lock:
+            self._ensure_columns(name, columns)
+            inserted = []
+            try:
+                for r in records:
+                    values = [_sql_value(c, r.get(c), dates) for c in columns]
+                    cur = self._conn.execute(
+                        f"INSERT INTO {_quote(name)} ({', '.join(map(_quote, columns))}) "
+                        f"VALUES ({', '.join('?' * len(columns))})",
+                        values,
+                    )
+                    inserted.append({'id': cur.lastrowid, **dict(zip(columns, values))})
+            except Exception:
+                # 途中で失敗したら全部取り消す（Supabase の複数行 insert と同じく、全部入るか何も入らないか）
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+        return inserted
+
+    def delete(self, name, ids):
+        self.remove(name, ids)
+
+
+class _Listener:
+    def __init__(self, store, name):
+        self.store = store
+        self.name = name
+
+    def reset(self, df):
+        self.store.replace(self.name, df)
+
+    def insert(self, rows):
+        self.store.upsert(self.name, rows)
+
+    def delete(self, rows):
+        if 'id' in rows.columns:
+            self.store.remove(self.name, rows['id'].tolist())
@@ -0,0 +1,73 @@
+import threading
+from collections import Counter
+import pandas as pd
+
+DONE_TYPE = '実績'
+
+
+class MonthlyRanking:
+    """
+    月ごとの登った回数（実績）の集計。キーは (年, 月) -> {ユーザー: 回数}。
+    TableMirror("climbing_logs") のリスナーとして、1行の追加/削除を O(1) で反映する。
+    過去の月も保持しているので、どの月のランキングもログ全体を見直さずに出せる。
+    """
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    # --- TableMirror からの通知 ---
+    def reset(self, df):
+        counts = {}
+        done = _done_rows(df)
+        if not done.empty:
+            sizes = done.groupby([done['date'].dt.year, done['date'].dt.month, 'user'], observed=True).size()
+            for (year, month, user), n in sizes.items():
+                counts.setdefault((int(year), int(month)), Counter())[user] = int(n)
+        with self._lock:
+            self._counts = counts
+
+    def insert(self, rows):
+        done = _done_rows(rows)
+        with self._lock:
+            for d, user in zip(done['date'], done['user']):
+                self._counts.setdefault((d.year, d.month), Counter())[user] += 1
+
+    def delete(self, rows):
+        done = _done_rows(rows)
+        with self._lock:
+            for d, user in zip(done['date'], done['user']):
+                month = self._counts.get((d.year, d.month))
+                if month is None or month[user] <= 0:
+                    continue
+                month[user] -= 1
+                if month[user] == 0:
+                    del month[user]
+
+    # --- 参照 ---
+    def months(self):
+        """集計のある (年, 月) の一覧（新しい順）"""
+        with self._lock:
+            return sorted((k for k, v in self._counts.items() if v), reverse=True)
+
+    def counts(self, year, month):
+        with self._lock:
+            return dict(self._counts.get((year, month), {}))
+
+    def ranking(self, year, month, users):
+        """
+        users 全員の回数と順位（同数は同順位）を返す。
+        戻り値: user, count, rank_num の DataFrame（順位・名前順）
+        """
+        counts = self.counts(year, month)
+        ranking = pd.DataFrame({'user': pd.unique(pd.Series(list(users), dtype=object))})
+        ranking['count'] = ranking['user'].map(lambda u: counts.get(u, 0)).astype(int)
+        ranking['rank_num'] = ranking['count'].rank(ascending=False, method='min').astype(int)
+        return ranking.sort_values(['rank_num', 'user']).reset_index(drop=True)
+
+
+def _done_rows(df):
+    if df.empty or 'type' not in df.columns:
+        return pd.DataFrame(columns=['user', 'date'])
+    done = df.loc[df['type'] == DONE_TYPE, ['user', 'date']]
+    return done[done['date'].notna()]
@@ -0,0 +1,175 @@
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque, namedtuple
+from functools import wraps
+
+# 計測結果はページ表示1回につき JSON 1行でこのロガーに出す。
+# 環境変数 PROFILE_LOG にパスを指定すると、そのファイルに追記する
+logger = logging.getLogger("climbing_app.profile")
+if os.environ.get("PROFILE_LOG"):
+    _handler = logging.FileHandler(os.environ["PROFILE_LOG"], encoding="utf-8")
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+# 環境変数 PROFILE=1 で起動時から有効（管理ページからも切り替えられる）
+_enabled = os.environ.get("PROFILE", "") not in ("", "0")
+_local = threading.local()
+_recent = deque(maxlen=50)
+_recent_lock = threading.Lock()
+
+
+# peak_bytes は tracemalloc で追跡中のときだけ入る（ベンチマーク用。普段は None）
+Stage = namedtuple("Stage", ["name", "kind", "seconds", "rows", "peak_bytes"])
+
+
+class PageTrace:
+    """1回の show_page の計測結果。stages は Stage のリスト"""
+
+    def __init__(self, page):
+        self.page = page
+        self.started_at = time.time()
+        self.seconds = 0.0
+        self.stages = []
+        self.counts = {}
+
+    def to_dict(self):
+        return {
+            "page": self.page,
+            "started_at": round(self.started_at, 3),
+            "ms": round(self.seconds * 1000, 2),
+            "stages": [
+                {"stage": s.name, "kind": s.kind, "ms": round(s.seconds * 1000, 2), "rows": s.rows,
+                 "peak_kb": None if s.peak_bytes is None else round(s.peak_bytes / 1024, 1)}
+                for s in self.stages
+            ],
+            "counts": dict(self.counts),
+        }
+
+
+class _NoopStage:
+    # 無効時に返す共有オブジェクト（何も記録しない）
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopStage()
+
+
+class _Stage:
+    def __init__(self, trace, name, kind):
+        self.trace, self.name, self.kind = trace, name, kind
+        self.rows = None
+
+    def __enter__(self):
+        # tracemalloc で追跡中なら、この段階の間に増えたメモリのピークも取る（入れ子の段階は外側が過小になる）
+        self._mem0 = None
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            self._mem0 = tracemalloc.get_traced_memory()[0]
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._t0
+        peak = None
+        if self._mem0 is not None:
+            peak = max(0, tracemalloc.get_traced_memory()[1] - self._mem0)
+        self.trace.stages.append(Stage(self.name, self.kind, seconds, self.rows, peak))
+        return False
+
+
+class _Page:
+    def __init__(self, page):
+        self.trace = PageTrace(page)
+
+    def __enter__(self):
+        _local.trace = self.trace
+        self._t0 = time.perf_counter()
+        return self.trace
+
+    def __exit__(self, *exc):
+        self.trace.seconds = time.perf_counter() - self._t0
+        _local.trace = None
+        with _recent_lock:
+            _recent.append(self.trace)
+        logger.info(json.dumps(self.trace.to_dict(), ensure_ascii=False))
+        return False
+
+
+def enabled():
+    return _enabled
+
+
+def set_enabled(value):
+    """計測のオン/オフ（プロセス全体）"""
+    global _enabled
+    _enabled = bool(value)
+
+
+def page(name):
+    """show_page 1回分を計測する: with profiler.page("home"): home.show_page()"""
+    if not _enabled:
+        return _NOOP
+    return _Page(name)
+
+
+def _current():
+    return getattr(_local, "trace", None) if _enabled else None
+
+
+def stage(name, kind="transform"):
+    """
+    計測中のページに段階を1つ記録する（kind: fetch / transform / render）。
+    行数は with の中で s.rows = n と入れておく。計測していなければ何もしない。
+    """
+    trace = _current()
+    if trace is None:
+        return _NOOP
+    return _Stage(trace, name, kind)
+
+
+def count(key, n=1):
+    """計測中のページのカウンタ（cache_hit / cache_miss / elements など）を足す"""
+    trace = _current()
+    if trace is not None:
+        trace.counts[key] = trace.counts.get(key, 0) + n
+
+
+def timed(kind="transform", name=None):
+    """関数呼び出しを段階として記録するデコレータ（戻り値が DataFrame/list なら行数も）"""
+    def decorator(func):
+        label = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            trace = _current()
+            if trace is None:
+                return func(*args, **kwargs)
+            with _Stage(trace, label, kind) as s:
+                result = func(*args, **kwargs)
+                if hasattr(result, "__len__"):
+                    s.rows = len(result)
+            return result
+        return wrapper
+    return decorator
+
+
+def recent_traces():
+    """最近の計測結果（新しい順）"""
+    with _recent_lock:
+        return list(reversed(_recent))
+
+
+def clear():
+    with _recent_lock:
+        _recent.clear()
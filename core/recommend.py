@@ -0,0 +1,113 @@
+import pandas as pd
+from core.profiler import timed
+
+# --- スコア設定 ---
+FRESH_SCORE = 40        # 新セット（1〜7日前）
+SEMI_FRESH_SCORE = 30   # 準新セット（8〜14日前）
+FRIEND_SCORE = 15       # ターゲット日に仲間の予定あり
+UNVISITED_SCORE = 10    # 未訪問
+LONG_TIME_SCORE = 20    # 30日以上ご無沙汰
+
+# 同点のときの並び順用（セット日がないジムは一番古い扱い）
+_NO_SET_DATE = pd.Timestamp("2000-01-01")
+
+RESULT_COLS = ['gym_name', 'area_tag', 'profile_url', 'score', 'reasons', 'latest_set_date']
+
+
+@timed()
+def recommend_gyms(gym_df, sched_df, log_df, user, target_date, allowed_tags=None, top_k=5, sched_index=None):
+    """
+    おすすめジムのスコアリング（Streamlitに依存しない純粋関数）。
+    ジムごとの「最新セット終了日」「自分の最新訪問日」「ターゲット日の仲間の予定数」を
+    groupby で一度に求め、スコアは列演算で計算して上位 top_k 件を返す。
+
+    sched_index（core.schedule_index.GymScheduleIndex）を渡すと、最新セット日は sched_df を
+    走査せずにインデックスから引く。
+
+    戻り値: RESULT_COLS の DataFrame（スコア降順）。
+            reasons は表示用タグ文字列のリスト、latest_set_date はセット日がなければ NaT。
+    """
+    if gym_df.empty:
+        return pd.DataFrame(columns=RESULT_COLS)
+
+    t_dt = pd.Timestamp(target_date).normalize()
+
+    gyms = gym_df[['gym_name', 'area_tag', 'profile_url']]
+    if allowed_tags is not None:
+        gyms = gyms[gyms['area_tag'].isin(list(allowed_tags))]
+    if gyms.empty:
+        return pd.DataFrame(columns=RESULT_COLS)
+
+    # 1. ジムごとの最新セット日（ターゲット日以前に終わったもの）
+    if sched_index is not None:
+        latest_set = sched_index.latest_ends_before(t_dt).dt.normalize()
+    elif not sched_df.empty:
+        past_sets = sched_df[sched_df['end_date'] <= t_dt]
+        latest_set = past_sets.groupby('gym_name', observed=True)['end_date'].max().dt.normalize()
+    else:
+        latest_set = pd.Series(dtype='datetime64[ns]')
+
+    # 2. 自分のジムごとの最新訪問日 / 3. ターゲット日の仲間の予定数
+    if not log_df.empty:
+        my_done = log_df[(log_df['user'] == user) & (log_df['type'] == '実績')]
+        latest_visit = my_done.groupby('gym_name', observed=True)['date'].max().dt.normalize()
+        friend_plans = log_df[
+            (log_df['type'] == '予定') & (log_df['date'] == t_dt) & (log_df['user'] != user)
+        ]
+        friends = friend_plans['gym_name'].value_counts()
+    else:
+        latest_visit = pd.Series(dtype='datetime64[ns]')
+        friends = pd.Series(dtype='int64')
+
+    df = gyms.reset_index(drop=True)
+    names = df['gym_name'].to_numpy()
+    df['latest_set_date'] = pd.to_datetime(latest_set.reindex(names).to_numpy())
+    df['latest_visit_date'] = pd.to_datetime(latest_visit.reindex(names).to_numpy())
+    df['friends'] = friends.reindex(names).fillna(0).astype(int).to_numpy()
+
+    # セット後にすでに登っているジムは出さない
+    done_after_set = df['latest_visit_date'].notna() & df['latest_set_date'].notna() & \
+        (df['latest_visit_date'] >= df['latest_set_date'])
+    df = df[~done_after_set]
+
+    # ① 鮮度スコア
+    set_days = (t_dt - df['latest_set_date']).dt.days
+    fresh = set_days.between(1, 7)
+    semi_fresh = set_days.between(8, 14)
+    # ② 仲間スコア
+    has_friends = df['friends'] > 0
+    # ③ 実績スコア
+    visit_days = (t_dt - df['latest_visit_date']).dt.days
+    unvisited = df['latest_visit_date'].isna()
+    long_time = visit_days >= 30
+
+    df = df.assign(
+        set_days=set_days, visit_days=visit_days,
+        fresh=fresh, semi_fresh=semi_fresh, has_friends=has_friends,
+        unvisited=unvisited, long_time=long_time,
+        score=fresh * FRESH_SCORE + semi_fresh * SEMI_FRESH_SCORE + has_friends * FRIEND_SCORE
+        + unvisited * UNVISITED_SCORE + long_time * LONG_TIME_SCORE,
+        set_sort_key=df['latest_set_date'].fillna(_NO_SET_DATE),
+    )
+    # どの理由にも当てはまらない（スコア0の）ジムは対象外
+    df = df[df['score'] > 0]
+    top = df.nlargest(top_k, ['score', 'set_sort_key'], keep='first')
+
+    # 理由タグは上位 top_k 件の分だけ組み立てる
+    top = top.assign(reasons=[_reasons(r) for r in top.itertuples(index=False)])
+    return top[RESULT_COLS].reset_index(drop=True)
+
+
+def _reasons(r):
+    reasons = []
+    if r.fresh:
+        reasons.append(f"🔥 新セット({int(r.set_days)}日前)")
+    elif r.semi_fresh:
+        reasons.append(f"✨ 準新セット({int(r.set_days)}日前)")
+    if r.has_friends:
+        reasons.append(f"👥 仲間{r.friends}名")
+    if r.unvisited:
+        reasons.append("🆕 未訪問")
+    elif r.long_time:
+        reasons.append(f"⌛ {int(r.visit_days)}日ぶり")
+    return reasons
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+MONTH_LABEL = '{:04d}年{:02d}月'
+# 月をまたぐ予定でも、これ以上の月数には展開しない（データの誤りで終了日が極端に先の場合の保険）
+MAX_SPAN_MONTHS = 12
+
+
+class ScheduleMonthIndex:
+    """
+    セットスケジュールの月インデックス。年月 -> その月にかかる行（開始日順）。
+    3/30〜4/2 のように月をまたぐ予定は両方の月に入る。
+    データの世代ごとに1回だけ作り、月の一覧と月ごとの表示はインデックスを引くだけにする。
+    """
+
+    def __init__(self, sched_df):
+        df = sched_df
+        if not df.empty:
+            df = df[df['start_date'].notna()].sort_values('start_date', kind='stable').reset_index(drop=True)
+        self.df = df
+        self._rows = {}  # (年, 月) -> 行番号の配列（開始日順）
+        if df.empty:
+            return
+
+        start = df['start_date']
+        end = df['end_date'].fillna(start) if 'end_date' in df.columns else start
+        first = (start.dt.year * 12 + start.dt.month - 1).to_numpy()
+        last = (end.dt.year * 12 + end.dt.month - 1).to_numpy()
+        span = np.clip(last - first + 1, 1, MAX_SPAN_MONTHS)
+
+        # 行ごとに、かかる月の数だけ (月, 行番号) を作る
+        pos = np.repeat(np.arange(len(df)), span)
+        offset = np.arange(len(pos)) - np.repeat(np.cumsum(span) - span, span)
+        month = first[pos] + offset
+        order = np.argsort(month, kind='stable')  # 同じ月の中は開始日順のまま
+        month, pos = month[order], pos[order]
+        keys, bounds = np.unique(month, return_index=True)
+        for key, rows in zip(keys, np.split(pos, bounds[1:])):
+            year, m0 = divmod(int(key), 12)
+            self._rows[(year, m0 + 1)] = rows
+
+    def months(self):
+        """予定のある (年, 月) の一覧（新しい順）"""
+        return sorted(self._rows, reverse=True)
+
+    def rows(self, year, month):
+        """その月にかかる予定（開始日順）"""
+        positions = self._rows.get((year, month))
+        if positions is None:
+            return self.df.iloc[0:0]
+        return self.df.iloc[positions]
+
+
+class GymScheduleIndex:
+    """
+    ジムごとのセット期間インデックス。セットを終了日順に並べた配列を持ち、
+    「T 以前に終わった最新のセット」「[a, b] にかかるセット」「D 以降に始まるセットがあるか」を
+    二分探索（np.searchsorted）で O(log n) で答える。データの世代ごとに1回だけ作る。
+    """
+
+    def __init__(self, sched_df):
+        self._ends = {}        # gym -> 終了日の配列（昇順）
+        self._starts = {}      # gym -> 開始日の配列（_ends と同じ並び）
+        self._last_start = {}  # gym -> 一番新しい開始日
+        self._max_span = {}    # gym -> 一番長いセット期間（overlapping の打ち切り用）
+        if sched_df.empty:
+            return
+        df = sched_df[sched_df['start_date'].notna()]
+        df = pd.DataFrame({
+            'gym_name': df['gym_name'].astype(str).to_numpy(),
+            'start_date': df['start_date'].to_numpy('datetime64[ns]'),
+            'end_date': df['end_date'].fillna(df['start_date']).to_numpy('datetime64[ns]'),
+        }).sort_values(['gym_name', 'end_date', 'start_date'], kind='stable')
+        gyms = df['gym_name'].to_numpy()
+        starts, ends = df['start_date'].to_numpy(), df['end_date'].to_numpy()
+        names, bounds = np.unique(gyms, return_index=True)
+        for gym, lo, hi in zip(names, bounds, list(bounds[1:]) + [len(df)]):
+            self._ends[gym], self._starts[gym] = ends[lo:hi], starts[lo:hi]
+            self._last_start[gym] = starts[lo:hi].max()
+            self._max_span[gym] = (ends[lo:hi] - starts[lo:hi]).max()
+
+    def latest_end_before(self, gym, t):
+        """gym のセットのうち t 以前に終わったものの最新の終了日（なければ None）"""
+        ends = self._ends.get(gym)
+        if ends is None:
+            return None
+        i = np.searchsorted(ends, _dt64(t), side='right')
+        return pd.Timestamp(ends[i - 1]) if i else None
+
+    def latest_ends_before(self, t):
+        """全ジムの latest_end_before を Series（index: gym_name）で"""
+        t = _dt64(t)
+        latest = {}
+        for gym, ends in self._ends.items():
+            i = np.searchsorted(ends, t, side='right')
+            if i:
+                latest[gym] = ends[i - 1]
+        return pd.Series(latest, dtype='datetime64[ns]')
+
+    def overlapping(self, gym, a, b):
+        """gym のセットのうち [a, b] に1日でもかかるもの: [(start, end), ...]（終了日順）"""
+        ends = self._ends.get(gym)
+        if ends is None:
+            return []
+        a, b = _dt64(a), _dt64(b)
+        # 終了日が a 以降で、終了日 - 最長期間 が b 以前（= 開始日が b 以前でありうる）範囲だけ見る
+        lo = np.searchsorted(ends, a, side='left')
+        hi = np.searchsorted(ends, b + self._max_span[gym], side='right')
+        starts = self._starts[gym]
+        return [(pd.Timestamp(starts[i]), pd.Timestamp(ends[i])) for i in range(lo, hi) if starts[i] <= b]
+
+    def has_start_since(self, gym, d):
+        """gym に d 以降に始まるセットがあるか"""
+        last = self._last_start.get(gym)
+        return last is not None and last >= _dt64(d)
+
+    def gyms_with_start_since(self, d):
+        """d 以降に始まるセットがあるジム名の set"""
+        d = _dt64(d)
+        return {gym for gym, last in self._last_start.items() if last >= d}
+
+
+def _dt64(t):
+    return pd.Timestamp(t).to_datetime64().astype('datetime64[ns]')
@@ -0,0 +1,57 @@
+from dataclasses import dataclass
+import pandas as pd
+
+# 日付として扱うカラム（Supabaseからは文字列で届く）
+DATE_COLS = ['date', 'start_date', 'end_date', 'created_at']
+
+
+@dataclass(frozen=True)
+class TableSchema:
+    columns: tuple = None          # 残すカラム（None なら全部）
+    categories: tuple = ()         # 同じ文字列が何度も出るカラム -> category
+    dates: tuple = tuple(DATE_COLS)
+    indexes: tuple = ()            # ローカルミラー（core.local_store）に張るインデックス（カラムのタプル）
+
+
+# テーブルごとの型定義。ここにないテーブルは日付の変換だけ行う
+SCHEMAS = {
+    "climbing_logs": TableSchema(
+        columns=('id', 'date', 'user', 'gym_name', 'type', 'time_slot'),
+        categories=('user', 'gym_name', 'type', 'time_slot'),
+        indexes=(('type', 'date'), ('user', 'date')),
+    ),
+    "set_schedules": TableSchema(categories=('gym_name',), indexes=(('gym_name', 'start_date'),)),
+}
+_DEFAULT = TableSchema()
+
+
+def select_columns(table):
+    """Supabase の select に渡すカラム指定（使わないカラムは最初から取らない）"""
+    schema = SCHEMAS.get(table, _DEFAULT)
+    return ",".join(schema.columns) if schema.columns else "*"
+
+
+def apply_schema(df, table=None):
+    """
+    DataFrame をテーブルの型定義に揃える。
+    日付は tz-naive の datetime64[ns]、繰り返しの多い文字列は category にする。
+    category の列は == や isin がコード（整数）の比較になり、メモリも小さい。
+    groupby するときは observed=True、value_counts は0件のカテゴリも出るので注意。
+    """
+    if df.empty:
+        return df
+    schema = SCHEMAS.get(table, _DEFAULT)
+    if schema.columns:
+        df = df[[c for c in schema.columns if c in df.columns]]
+    else:
+        df = df.copy()
+    for col in schema.dates:
+        if col in df.columns and df[col].dtype != 'datetime64[ns]':
+            values = pd.to_datetime(df[col])
+            if values.dt.tz is not None:
+                values = values.dt.tz_localize(None)
+            df[col] = values.astype('datetime64[ns]')
+    for col in schema.categories:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    return df
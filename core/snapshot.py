@@ -0,0 +1,40 @@
+import threading
+from core import profiler
+
+
+class SnapshotStore:
+    """
+    プロセス全体で共有する、TableMirror のフレーム（スナップショット）から作ったインデックス
+    （ScheduleMonthIndex など）。元のフレームが差し替わるまで全セッションで使い回す。
+
+    TableMirror は更新のたびにフレームを丸ごと差し替える（中身は書き換えない）ので、
+    「フレームが同じオブジェクトか」でインデックスの鮮度を判定できる。
+    フレームは共有物なので、ページ側では書き換えずに
+    絞り込み・assign（pandas の Copy-on-Write で必要な列だけコピーされる）で使うこと。
+    """
+
+    def __init__(self):
+        self._index_builders = {}  # テーブル名 -> {インデックス名: snapshot -> index}
+        self._indexes = {}         # テーブル名 -> (スナップショット, {インデックス名: index})
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def register_index(self, name, key, builder):
+        """テーブル name のスナップショットから builder(snapshot) でインデックス key を作れるようにする"""
+        with self._lock:
+            self._index_builders.setdefault(name, {})[key] = builder
+            self._indexes.pop(name, None)
+
+    def index(self, name, key, snapshot):
+        """snapshot（get_tables で返したフレーム）に対応するインデックス。世代ごとに最初の1回だけ作る"""
+        with self._build_lock:
+            cached = self._indexes.get(name)
+            if cached is None or cached[0] is not snapshot:
+                cached = (snapshot, {})
+                self._indexes[name] = cached
+            built = cached[1]
+            if key not in built:
+                with profiler.stage(f"build_index:{name}.{key}") as s:
+                    built[key] = self._index_builders[name][key](snapshot)
+                    s.rows = len(snapshot)
+            return built[key]
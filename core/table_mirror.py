@@ -0,0 +1,478 @@
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from core import profiler
+from core.schema import SCHEMAS, TableSchema, apply_schema
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_frame(records, table=None):
+    """Supabaseのレコード(list[dict])をDataFrameに変換し、テーブルの型定義（core.schema）に揃える"""
+    if not records:
+        return pd.DataFrame()
+    return apply_schema(pd.DataFrame(records), table)
+
+
+class _MirrorEntry:
+    def __init__(self, df):
+        self.df = df
+        self.hwm = _max_id(df)
+        now = time.monotonic()
+        self.synced_at = now
+        self.reconciled_at = now
+        self.lock = threading.Lock()
+
+
+def _max_id(df):
+    if df.empty or 'id' not in df.columns:
+        return None
+    return df['id'].max()
+
+
+def _naive(value):
+    ts = pd.Timestamp(value)
+    return ts.tz_localize(None) if ts.tz is not None else ts
+
+
+def _new_rows(df, rows):
+    # rows のうち df にまだない id の行だけを返す
+    if rows.empty or df.empty or 'id' not in df.columns or 'id' not in rows.columns:
+        return rows
+    return rows[~rows['id'].isin(df['id'])]
+
+
+def _append(name, df, rows):
+    # カテゴリが違う category 列同士を concat すると object に戻るので、型定義をかけ直す
+    df = pd.concat([df, rows], ignore_index=True)
+    if 'id' in df.columns:
+        df = df.drop_duplicates(subset='id', keep='last').reset_index(drop=True)
+    return apply_schema(df, name)
+
+
+class TableMirror:
+    """
+    Supabaseテーブルのプロセス内ミラー。
+    初回だけ全件取得し、以降は id の高水位(hwm)より新しい行だけを取り込む。
+    削除は reconcile_interval ごとに id 一覧と突き合わせて反映する。このとき、hwm より小さい id で
+    あとからコミットされた行（同時に書き込んだ別プロセスなど）も、手元にない id として取り込む。
+    行の更新(UPDATE)はこのアプリでは発生しない前提。
+
+    subscribe したリスナーには行の増減が通知される（派生インデックスの差分更新用）。
+    リスナーは reset(df) / insert(rows) / delete(rows) を持つオブジェクト。
+
+    start_refresher() するとバックグラウンドのスレッドが最近読まれたテーブルを
+    TTL 切れの前に同期するので、get は同期を待たずに手元のコピーを返す。
+    同じテーブルの取得は同時に1本だけ（初回ロードも差分同期も）。
+
+    書き込みはサーバーの応答を待たずに先に反映できる（apply_provisional / apply_delete）。
+    追加した行にはサーバーの id が決まるまで仮の id（負の数）をつけ、confirm_insert で本物に置き換える。
+    サーバーに拒否されたら取り消す（追加は apply_delete、削除は restore）。
+    削除は送信が終わるまで（finish_delete まで）、同期でサーバーから同じ行を取り込み直さない。
+
+    seed を渡すと、初回ロードは全件取得の代わりに手元の控え（core.local_store など）から始めて、
+    そこからの差分同期と削除の突き合わせだけを行う。同期に失敗しても控えのまま動き続ける。
+    """
+
+    def __init__(self, fetch_rows, fetch_ids, ttl=10, reconcile_interval=60, seed=None, fetch_by_ids=None):
+        # fetch_rows(name, since_id) -> list[dict]  (since_id=None なら全件)
+        # fetch_ids(name) -> list  (削除検知用の id 一覧)
+        # seed(name) -> DataFrame または None  (控えがなければ None)
+        # fetch_by_ids(name, ids) -> list[dict]  (突き合わせで見つかった手元にない行。なければ全件から拾う)
+        self._fetch_rows = fetch_rows
+        self._fetch_ids = fetch_ids
+        self._fetch_by_ids = fetch_by_ids
+        self._seed = seed
+        self.ttl = ttl
+        self.reconcile_interval = reconcile_interval
+        self._entries = {}
+        # テーブルごとの世代番号。未ロードのテーブルへの書き込みでも進める
+        self._versions = {}
+        self._listeners = {}
+        self._load_locks = {}
+        self._accessed = {}  # テーブル名 -> 最後に get された時刻
+        self._refresher = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._provisional_ids = itertools.count(-1, -1)
+        self._confirmed = {}  # 仮の id -> 本物の id（最近のものだけ）
+        self._deleting = {}   # テーブル名 -> 削除を送信中の id（同期で取り込み直さない）
+        self._lock = threading.Lock()
+
+    def _entry(self, name):
+        with self._lock:
+            return self._entries.get(name)
+
+    def loaded(self, name):
+        """テーブルが手元にあるか（一度でもロードしたか）"""
+        return self._entry(name) is not None
+
+    def version(self, name):
+        """テーブルのデータバージョン（中身が変わるたびに +1）"""
+        with self._lock:
+            return self._versions.get(name, 0)
+
+    def bump(self, name):
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+
+    def subscribe(self, name, listener):
+        """テーブルの変更通知を受け取るリスナーを登録する（ロード済みなら現在の中身で reset される）"""
+        with self._lock:
+            self._listeners.setdefault(name, []).append(listener)
+        entry = self._entry(name)
+        if entry is not None:
+            with entry.lock:
+                listener.reset(entry.df)
+
+    def _notify(self, name, event, rows):
+        if rows.empty and event != 'reset':
+            return
+        with self._lock:
+            listeners = list(self._listeners.get(name, ()))
+        for listener in listeners:
+            getattr(listener, event)(rows)
+
+    def get(self, name):
+        """テーブルの最新DataFrameを返す（必要なら差分同期してから）"""
+        if profiler.enabled():
+            profiler.count("cache_miss" if self._needs_fetch(name) else "cache_hit")
+        return self._get(name)
+
+    def _get(self, name):
+        with self._lock:
+            self._accessed[name] = time.monotonic()
+        entry = self._entry(name)
+        if entry is None:
+            return self._load(name).df
+        if entry.synced_at == float('-inf'):
+            # mark_stale された直後は待ってでも同期する（書き込んだ本人に古いデータを見せない）
+            self._sync(name, entry, wait=True)
+        elif time.monotonic() - entry.synced_at >= self.ttl:
+            if self._refreshing():
+                # 同期はバックグラウンドに任せて、手元のコピーをそのまま返す
+                self._wake.set()
+            else:
+                self._sync(name, entry)
+        return entry.df
+
+    def query(self, name, columns=(), eq=(), neq=(), gte=(), lte=(), order=None):
+        """
+        手元のテーブルを絞り込む（query_supabase_data と同じ意味。通信はしない）。
+        eq/neq/gte/lte は ((カラム名, 値), ...)。返す DataFrame は使われていないカテゴリを落としてある。
+        """
+        df = self._get(name)
+        if df.empty:
+            return pd.DataFrame()
+        dates = SCHEMAS.get(name, TableSchema()).dates
+        mask = pd.Series(True, index=df.index)
+        for preds, op in ((eq, '__eq__'), (neq, '__ne__'), (gte, '__ge__'), (lte, '__le__')):
+            for col, v in preds:
+                if col in dates:
+                    v = _naive(v)
+                mask &= getattr(df[col], op)(v)
+                if op == '__ne__':
+                    mask &= df[col].notna()  # SQL と同じく NULL は != にも当てはまらない
+        out = df.loc[mask, list(columns) if columns else df.columns]
+        if out.empty:
+            return pd.DataFrame()
+        if order:
+            out = out.sort_values(order, kind='stable')
+        out = out.reset_index(drop=True)
+        for col in out.columns:
+            if isinstance(out[col].dtype, pd.CategoricalDtype):
+                out[col] = out[col].cat.remove_unused_categories()
+        return out
+
+    def get_many(self, names, max_workers=5):
+        """
+        複数テーブルをまとめて返す。通信が必要なテーブル（未ロード・期限切れ）は並列に取得するので、
+        待ち時間は合計ではなく一番遅いテーブルの分だけになる。
+        戻り値: {name: DataFrame または取得時の例外}
+        """
+        names = list(dict.fromkeys(names))
+        fetch = [n for n in names if self._needs_fetch(n)]
+        profiler.count("cache_miss", len(fetch))
+        profiler.count("cache_hit", len(names) - len(fetch))
+        results = {}
+        if len(fetch) > 1:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(fetch))) as pool:
+                futures = {n: pool.submit(self._get, n) for n in fetch}
+                for n, future in futures.items():
+                    try:
+                        results[n] = future.result()
+                    except Exception as e:
+                        results[n] = e
+        for n in names:
+            if n not in results:
+                try:
+                    results[n] = self._get(n)
+                except Exception as e:
+                    results[n] = e
+        return {n: results[n] for n in names}
+
+    def _needs_fetch(self, name):
+        entry = self._entry(name)
+        if entry is None or entry.synced_at == float('-inf'):
+            return True
+        return not self._refreshing() and time.monotonic() - entry.synced_at >= self.ttl
+
+    def _load(self, name):
+        # 初回ロードはテーブルごとに1本だけ。同時に来た他のセッションは終わるのを待って同じ結果を使う
+        with self._lock:
+            lock = self._load_locks.setdefault(name, threading.Lock())
+        with lock:
+            entry = self._entry(name)
+            if entry is None:
+                entry = self._load_full(name)
+        return entry
+
+    def _load_full(self, name):
+        seeded = self._seed(name) if self._seed else None
+        df = seeded if seeded is not None else normalize_frame(self._fetch_rows(name, None), name)
+        entry = _MirrorEntry(df)
+        if seeded is not None:
+            # 控えにない行の取り込みと、控えにしか残っていない（削除済みの）行の突き合わせをすぐに行う
+            entry.synced_at = entry.reconciled_at = float('-inf')
+        with entry.lock:
+            with self._lock:
+                self._entries[name] = entry
+            self._notify(name, 'reset', df)
+        self.bump(name)
+        if seeded is not None:
+            try:
+                self._sync(name, entry, wait=True)
+            except Exception:
+                # 通信できなくても控えを返す（次の周期で同期をやり直す）
+                logger.exception("Sync of %s failed, using the local copy", name)
+                entry.synced_at = time.monotonic()
+        return entry
+
+    # --- バックグラウンド同期 ---
+    def start_refresher(self, interval=None, hot_window=300):
+        """
+        バックグラウンドの同期スレッドを起動する（起動済み・close 済みなら何もしない）。
+        hot_window 秒以内に get されたテーブルを interval 秒ごとに見て、
+        TTL 切れの少し前（ttl - interval 経過）に差分同期しておく。
+        """
+        interval = interval or self.ttl / 2
+        with self._lock:
+            if self._refreshing() or self._stop.is_set():
+                return
+            self._refresher = threading.Thread(
+                target=self._refresh_loop, args=(interval, hot_window),
+                name="table-mirror-refresher", daemon=True,
+            )
+            self._refresher.start()
+
+    def _refreshing(self):
+        return self._refresher is not None and self._refresher.is_alive()
+
+    def close(self, timeout=None):
+        """バックグラウンドの同期スレッドを止める（st.cache_resource から外れたときに呼ぶ）"""
+        self._stop.set()
+        self._wake.set()
+        refresher = self._refresher
+        if refresher is not None and refresher is not threading.current_thread():
+            refresher.join(timeout)
+
+    def _refresh_loop(self, interval, hot_window):
+        while not self._stop.is_set():
+            self._wake.wait(interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            now = time.monotonic()
+            with self._lock:
+                hot = [(n, e) for n, e in self._entries.items() if now - self._accessed.get(n, now) <= hot_window]
+            for name, entry in hot:
+                if now - entry.synced_at < self.ttl - interval:
+                    continue
+                try:
+                    self._sync(name, entry)
+                except Exception:
+                    # 失敗しても古いコピーを返し続けて、次の周期でやり直す
+                    logger.exception("Background refresh of %s failed", name)
+
+    def _sync(self, name, entry, wait=False):
+        # 同じテーブルの同期は同時に1本だけ（他のセッションは手元のコピーを使う）
+        if not entry.lock.acquire(blocking=wait):
+            return
+        try:
+            if wait and entry.synced_at != float('-inf'):
+                # 待っている間に他のスレッドが同期し終えた
+                return
+            if entry.hwm is None:
+                # id がないテーブル（または空テーブル）は差分が取れないので全件取り直す
+                fresh = normalize_frame(self._fetch_rows(name, None), name)
+                entry.df, entry.hwm = fresh, _max_id(fresh)
+                entry.synced_at = entry.reconciled_at = time.monotonic()
+                self._notify(name, 'reset', fresh)
+                self.bump(name)
+                return
+
+            # 削除の完了待ちの行はサーバーにはまだあるので、差分・突き合わせで戻さない
+            with self._lock:
+                deleting = set(self._deleting.get(name, ()))
+            delta = normalize_frame(self._fetch_rows(name, entry.hwm), name)
+            if deleting and not delta.empty:
+                delta = delta[~delta['id'].isin(deleting)]
+            df = entry.df
+            changed = False
+            if not delta.empty:
+                # safe_save で反映済みの行も返ってくるので、本当に新しい行だけ通知する
+                self._notify(name, 'insert', _new_rows(df, delta))
+                df = _append(name, df, delta)
+                # hwm は取得した行だけから進める（apply_insert で先に入れた行の id は使わない）
+                entry.hwm = max(entry.hwm, _max_id(delta))
+                changed = True
+
+            now = time.monotonic()
+            if now - entry.reconciled_at >= self.reconcile_interval:
+                # 削除の反映：サーバーに残っている id だけを残す（仮 id の行は書き込みの完了待ちなので残す）
+                server_ids = self._fetch_ids(name)
+                alive = df['id'].isin(server_ids) | (df['id'] < 0)
+                if not alive.all():
+                    self._notify(name, 'delete', df[~alive])
+                    df = df[alive].reset_index(drop=True)
+                    changed = True
+                # hwm より前の id で遅れてコミットされた行は差分取得に入らないので、ここで取り込む
+                missing = sorted(set(server_ids) - set(df['id']) - deleting)
+                if missing:
+                    rows = normalize_frame(self._fetch_missing(name, missing), name)
+                    if not rows.empty:
+                        self._notify(name, 'insert', _new_rows(df, rows))
+                        df = _append(name, df, rows)
+                        changed = True
+                entry.reconciled_at = now
+
+            entry.synced_at = now
+            if changed:
+                entry.df = df
+                self.bump(name)
+        finally:
+            entry.lock.release()
+
+    def _fetch_missing(self, name, ids):
+        if self._fetch_by_ids is not None:
+            return self._fetch_by_ids(name, ids)
+        wanted = set(ids)
+        return [r for r in self._fetch_rows(name, None) if r.get('id') in wanted]
+
+    def mark_stale(self, name, reconcile=False):
+        """次の get で必ず差分同期させる（reconcile=True なら削除の突き合わせも行う）"""
+        entry = self._entry(name)
+        if entry is not None:
+            entry.synced_at = float('-inf')
+            if reconcile:
+                entry.reconciled_at = float('-inf')
+        self.bump(name)
+
+    def apply_insert(self, name, records):
+        """
+        safe_save で追加した行をキャッシュに直接反映する。
+        hwm は進めない（他セッションが同時に追加した小さい id を取りこぼさないため）。
+        次の差分同期で同じ行が返ってきても id で重複排除される。
+        """
+        if not records:
+            return
+        entry = self._entry(name)
+        if entry is not None:
+            new_rows = normalize_frame(records, name)
+            with entry.lock:
+                self._notify(name, 'insert', _new_rows(entry.df, new_rows))
+                entry.df = _append(name, entry.df, new_rows)
+        self.bump(name)
+
+    def apply_delete(self, name, ids, in_flight=False):
+        """
+        safe_save で削除した行をキャッシュから直接取り除く。
+        in_flight=True はサーバーの削除がまだ終わっていないとき（finish_delete を呼ぶまで同期で戻さない）。
+        戻り値: 取り除いた行（restore で戻せる）。未ロードなら None
+        """
+        if in_flight:
+            with self._lock:
+                self._deleting.setdefault(name, set()).update(ids)
+        entry = self._entry(name)
+        removed = None
+        if entry is not None and not entry.df.empty and 'id' in entry.df.columns:
+            with entry.lock:
+                hit = entry.df['id'].isin(list(ids))
+                removed = entry.df[hit]
+                if hit.any():
+                    self._notify(name, 'delete', removed)
+                    entry.df = entry.df[~hit].reset_index(drop=True)
+        self.bump(name)
+        return removed
+
+    def apply_provisional(self, name, records):
+        """
+        サーバーの応答を待たずに、追加する行を仮の id（負の数）で先に反映する。
+        戻り値: 仮の id のリスト（confirm_insert に渡す）。未ロードのテーブルなら None
+        """
+        entry = self._entry(name)
+        if entry is None or not records:
+            return None
+        ids = [next(self._provisional_ids) for _ in records]
+        rows = normalize_frame([{**r, 'id': i} for r, i in zip(records, ids)], name)
+        with entry.lock:
+            self._notify(name, 'insert', rows)
+            entry.df = _append(name, entry.df, rows)
+        self.bump(name)
+        return ids
+
+    def confirm_insert(self, name, provisional_ids, records):
+        """
+        仮の行を、サーバーが返した行（本物の id つき）に置き換える。
+        records が空（行が返ってこなかった）なら仮の行を消して、次の get で差分同期させる。
+        """
+        entry = self._entry(name)
+        if entry is None:
+            self.apply_insert(name, records)
+            return
+        rows = normalize_frame(records, name)
+        if len(rows) == len(provisional_ids) and 'id' in rows.columns:
+            # サーバーは送った順に返すので、仮の id と本物の id を順番で対応づけておく
+            with self._lock:
+                self._confirmed.update(zip(provisional_ids, rows['id'].tolist()))
+                while len(self._confirmed) > 1000:
+                    self._confirmed.pop(next(iter(self._confirmed)))
+        with entry.lock:
+            hit = entry.df['id'].isin(list(provisional_ids))
+            if hit.any():
+                self._notify(name, 'delete', entry.df[hit])
+            self._notify(name, 'insert', _new_rows(entry.df[~hit], rows))
+            df = entry.df[~hit].reset_index(drop=True)
+            entry.df = _append(name, df, rows) if not rows.empty else df
+        if rows.empty:
+            self.mark_stale(name)
+        else:
+            self.bump(name)
+
+    def resolve_id(self, row_id):
+        """仮の id なら確定した本物の id を返す（まだ確定していなければ None）。普通の id はそのまま"""
+        if row_id >= 0:
+            return row_id
+        with self._lock:
+            return self._confirmed.get(row_id)
+
+    def finish_delete(self, name, ids):
+        """apply_delete(in_flight=True) の削除が終わった（失敗も含む）"""
+        with self._lock:
+            deleting = self._deleting.get(name)
+            if deleting is not None:
+                deleting.difference_update(ids)
+
+    def restore(self, name, rows):
+        """apply_delete で取り除いた行を戻す（サーバーが削除を拒否したとき）"""
+        entry = self._entry(name)
+        if entry is None or rows is None or rows.empty:
+            return
+        with entry.lock:
+            rows = _new_rows(entry.df, rows)
+            self._notify(name, 'insert', rows)
+            entry.df = _append(name, entry.df, rows)
+        self.bump(name)
@@ -0,0 +1,120 @@
+# ページごとの表示用データ（ビューモデル）を作る純粋関数。
+# Streamlit に依存しないので、ページ側で (データの世代, ユーザー, 日付条件) をキーにキャッシュでき、
+# ベンチマークやスクリプトからもそのまま呼べる。HTML の組み立てと st.* の呼び出しはページ側に残す。
+import pandas as pd
+from core.profiler import timed
+
+# エリアタブの並び順
+AREA_ORDER = ["都内・神奈川", "関東", "関西", "全国"]
+DONE_TYPE, PLAN_TYPE = '実績', '予定'
+UNKNOWN_PROFILE = ("#CCC", "👤")
+
+
+@timed()
+def build_gym_options(gym_df, area_master, recent_gyms, mark):
+    """
+    ジム選択のエリアタブと選択肢（トップの予定登録・管理のセット登録で共通）。
+    最近行ったジムには mark を付ける。
+    戻り値: {"areas": [エリア, ...], "options": {エリア: {表示ラベル: ジム名}}}
+    """
+    if gym_df.empty or area_master.empty:
+        return {"areas": [], "options": {}}
+    merged = pd.merge(gym_df, area_master[['area_tag', 'major_area']], on='area_tag', how='left')
+    actual = [a for a in merged['major_area'].unique() if pd.notna(a)]
+    areas = [a for a in AREA_ORDER if a in actual] + [a for a in actual if a not in AREA_ORDER]
+    recent = set(recent_gyms)
+    options = {}
+    for area in areas:
+        names = sorted(merged.loc[merged['major_area'] == area, 'gym_name'].unique().tolist())
+        options[area] = {(f"{g} {mark}" if g in recent else g): g for g in names}
+    return {"areas": areas, "options": options}
+
+
+@timed()
+def build_ranking_view(ranking, profiles):
+    """
+    ランキング（MonthlyRanking.ranking の結果）に表示用の列を足す。
+    icon / color: プロフィール、rank_label: 1〜3位はメダル、
+    is_top: 3位以内かつ1回以上、active: 1回以上
+    """
+    medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+    return ranking.assign(
+        icon=ranking['user'].map(lambda u: profiles[u][1]),
+        color=ranking['user'].map(lambda u: profiles[u][0]),
+        rank_label=ranking['rank_num'].map(medals).fillna(ranking['rank_num'].astype(str) + "位"),
+        is_top=(ranking['rank_num'] <= 3) & (ranking['count'] > 0),
+        active=ranking['count'] > 0,
+    )
+
+
+@timed()
+def build_gym_list(gym_df, last_visits, sched_gyms):
+    """
+    ジム一覧（訪問済み / 未訪問）。
+    last_visits: ジム名 -> 最終訪問日、sched_gyms: 今月スケジュール登録のあるジム名
+    戻り値: (visited, unvisited)。列は name, area, url, last_date, no_sched（訪問済みは最終訪問日の新しい順）
+    """
+    gym_list = pd.DataFrame({
+        "name": gym_df['gym_name'],
+        "area": gym_df['area_tag'],
+        "url": gym_df['profile_url'] if 'profile_url' in gym_df.columns else '#',
+    })
+    gym_list['last_date'] = pd.to_datetime(gym_list['name'].map(last_visits))
+    gym_list['no_sched'] = ~gym_list['name'].isin(list(sched_gyms))
+    visited = gym_list[gym_list['last_date'].notna()].sort_values('last_date', ascending=False, kind='stable')
+    unvisited = gym_list[gym_list['last_date'].isna()]
+    return visited, unvisited
+
+
+@timed()
+def build_dashboard_view(log_df, start, end):
+    """
+    マイページの表示データ。log_df は自分のログ（id, date, gym_name, type, time_slot）。
+    戻り値: {"done": 期間内の実績（新しい順）, "plans": 全予定（日付順）,
+             "sessions": 実績の回数, "gyms": 実績のジム数, "gym_counts": gym_name, count（少ない順）}
+    """
+    if log_df.empty:
+        empty = pd.DataFrame()
+        return {"done": empty, "plans": empty, "sessions": 0, "gyms": 0,
+                "gym_counts": pd.DataFrame(columns=['gym_name', 'count'])}
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    done = log_df[
+        (log_df['type'] == DONE_TYPE) & (log_df['date'] >= start) & (log_df['date'] <= end)
+    ].sort_values('date', ascending=False)
+    plans = log_df[log_df['type'] == PLAN_TYPE].sort_values('date')
+    # gym_name は category なので、0件のジムは除く
+    counts = done['gym_name'].value_counts()
+    counts = counts[counts > 0].reset_index()
+    counts.columns = ['gym_name', 'count']
+    return {
+        "done": done,
+        "plans": plans,
+        "sessions": len(done),
+        "gyms": done['gym_name'].nunique(),
+        "gym_counts": counts.sort_values('count', ascending=True),
+    }
+
+
+@timed()
+def build_friend_plans(plan_df, user, include_me, profiles):
+    """
+    仲間の予定一覧（日付順）。plan_df は期間内の予定（user, gym_name, date）。
+    戻り値: date, gym_name, user, color, icon, display_name（自分は「(自分)」付き）, name_color の DataFrame
+    """
+    if plan_df.empty:
+        return pd.DataFrame(columns=['date', 'gym_name', 'user', 'color', 'icon', 'display_name', 'name_color'])
+    plans = plan_df if include_me else plan_df[plan_df['user'] != user]
+    plans = plans.sort_values('date')
+    color = plans['user'].map(lambda u: profiles.get(u, UNKNOWN_PROFILE)[0]).astype(str)
+    icon = plans['user'].map(lambda u: profiles.get(u, UNKNOWN_PROFILE)[1]).astype(str)
+    is_me = plans['user'] == user
+    name = plans['user'].astype(str)
+    return pd.DataFrame({
+        'date': plans['date'],
+        'gym_name': plans['gym_name'].astype(str),
+        'user': name,
+        'color': color,
+        'icon': icon,
+        'display_name': name.where(~is_me, name + " (自分)"),
+        'name_color': color.where(is_me, "#1A1A1A"),
+    })
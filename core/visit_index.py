@@ -0,0 +1,82 @@
+import threading
+from bisect import bisect_left, insort
+import pandas as pd
+
+DONE_TYPE = '実績'
+
+
+class VisitIndex:
+    """
+    (user, gym) ごとの訪問（実績）インデックス。
+    キーごとに訪問日をソート済みリストで持つので、
+    最終訪問日・初回訪問日・訪問回数は O(1)、1行の追加/削除は O(log n) で反映できる。
+    TableMirror("climbing_logs") のリスナーとして差分更新される。
+    """
+
+    def __init__(self):
+        self._dates = {}     # (user, gym) -> [Timestamp, ...]（昇順）
+        self._by_user = {}   # user -> set(gym)
+        self._lock = threading.Lock()
+
+    # --- TableMirror からの通知 ---
+    def reset(self, df):
+        dates, by_user = {}, {}
+        done = _done_rows(df)
+        if not done.empty:
+            grouped = done.sort_values('date').groupby(['user', 'gym_name'], observed=True, sort=False)['date']
+            for key, values in grouped:
+                dates[key] = list(values)
+                by_user.setdefault(key[0], set()).add(key[1])
+        with self._lock:
+            self._dates, self._by_user = dates, by_user
+
+    def insert(self, rows):
+        done = _done_rows(rows)
+        with self._lock:
+            for user, gym, d in zip(done['user'], done['gym_name'], done['date']):
+                insort(self._dates.setdefault((user, gym), []), d)
+                self._by_user.setdefault(user, set()).add(gym)
+
+    def delete(self, rows):
+        done = _done_rows(rows)
+        with self._lock:
+            for user, gym, d in zip(done['user'], done['gym_name'], done['date']):
+                dates = self._dates.get((user, gym))
+                if not dates:
+                    continue
+                i = bisect_left(dates, d)
+                if i < len(dates) and dates[i] == d:
+                    del dates[i]
+                if not dates:
+                    del self._dates[(user, gym)]
+                    self._by_user.get(user, set()).discard(gym)
+
+    # --- 参照 ---
+    def last_visit(self, user, gym):
+        dates = self._dates.get((user, gym))
+        return dates[-1] if dates else None
+
+    def first_visit(self, user, gym):
+        dates = self._dates.get((user, gym))
+        return dates[0] if dates else None
+
+    def visit_count(self, user, gym):
+        return len(self._dates.get((user, gym), ()))
+
+    def last_visits(self, user):
+        """ユーザーが訪問したことのあるジム -> 最終訪問日 の dict"""
+        with self._lock:
+            gyms = list(self._by_user.get(user, ()))
+            return {g: self._dates[(user, g)][-1] for g in gyms if self._dates.get((user, g))}
+
+    def gyms_since(self, user, since):
+        """since 以降に訪問したジム名のリスト"""
+        since = pd.Timestamp(since)
+        return [g for g, d in self.last_visits(user).items() if d >= since]
+
+
+def _done_rows(df):
+    if df.empty or 'type' not in df.columns:
+        return pd.DataFrame(columns=['user', 'gym_name', 'date'])
+    done = df.loc[df['type'] == DONE_TYPE, ['user', 'gym_name', 'date']]
+    return done[done['date'].notna()]
@@ -0,0 +1,276 @@
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+# 送信する前に失敗したエラー（サーバーには届いていないので、追加でもやり直してよい）
+_NOT_SENT = {"ConnectError", "ConnectTimeout", "PoolTimeout", "ConnectionRefusedError"}
+# PostgREST がデータベースに届かなかったときのエラーコード（PGRST000〜003、HTTP 503/504）
+_DB_UNREACHED = {"PGRST000", "PGRST001", "PGRST002", "PGRST003"}
+
+
+def _error_names(e):
+    return {c.__name__ for c in type(e).__mro__}
+
+
+def _http_status(e):
+    # HTTP のステータス。httpx.HTTPStatusError は response から、
+    # PostgREST の APIError は本文が JSON でない（ゲートウェイの 502 など）ときだけ code に数値で入る
+    # （JSON のときの code は PostgreSQL の SQLSTATE などで、HTTP のステータスではない）
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    if status is None and isinstance(getattr(e, "code", None), int):
+        status = e.code
+    return status
+
+
+def _not_sent(e):
+    return bool(_error_names(e) & _NOT_SENT) or getattr(e, "code", None) in _DB_UNREACHED
+
+
+def _maybe_applied(e):
+    # 送信したあとの通信エラー・タイムアウト・5xx は、サーバー側では書き込めている可能性がある
+    if _not_sent(e):
+        return False
+    if isinstance(e, (ConnectionError, TimeoutError)) or "TransportError" in _error_names(e):
+        return True
+    status = _http_status(e)
+    return status is not None and status >= 500
+
+
+def is_transient(e, idempotent=True):
+    """
+    やり直せば通るかもしれない失敗か。
+    idempotent=False（追加）は、2回書くと行が重複するので、送信前に失敗したものだけやり直す。
+    制約違反などサーバーに拒否されたものは、やり直しても同じなのですぐ失敗にする。
+    """
+    if _not_sent(e):
+        return True
+    return idempotent and _maybe_applied(e)
+
+
+class PendingWrite:
+    """
+    キューに入れた書き込み1件。wait(timeout) で完了を待てる（result は追加された行、error は失敗時の例外）。
+    add_done_callback(fn) の fn(pending) は完了時にワーカーのスレッドで呼ばれる（wait が返るより前）。
+    """
+
+    def __init__(self, table, kind, payload):
+        self.table = table
+        self.kind = kind          # 'insert' / 'delete'
+        self.payload = payload    # insert: [record, ...]、delete: [id, ...]
+        self.result = None
+        self.error = None
+        self._finished = False
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """完了したら True（timeout 秒たっても終わらなければ False）"""
+        return self._done.wait(timeout)
+
+    def add_done_callback(self, fn):
+        with self._lock:
+            if not self._finished:
+                self._callbacks.append(fn)
+                return
+        _run_callback(fn, self)
+
+    def _finish(self, result=None, error=None):
+        with self._lock:
+            self.result, self.error = result, error
+            self._finished = True
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            _run_callback(fn, self)
+        self._done.set()
+
+
+class WriteQueue:
+    """
+    書き込みをバックグラウンドのスレッドでまとめて実行するキュー。
+    前回の実行中に溜まった書き込みは、テーブルごとに
+      - 追加: max_batch 行ずつの複数行 insert
+      - 削除: id をまとめた1回の delete
+    にまとめる。一時的な失敗（is_transient）は backoff 秒から倍々に待って max_retries 回までやり直す。
+    まとめた追加が失敗したときは、他の人の行を巻き込まないように1件ずつやり直して失敗したものだけを失敗にする。
+
+    insert_rows(table, records) -> 追加した行、delete_rows(table, ids) は実際の書き込み処理。
+    結果のキャッシュへの反映は、呼び出し側が PendingWrite.add_done_callback で行う。
+    """
+
+    def __init__(self, insert_rows, delete_rows, max_batch=500, max_retries=4, backoff=0.5, linger=0.02):
+        self._insert_rows = insert_rows
+        self._delete_rows = delete_rows
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.linger = linger
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._worker = None
+        self._closed = False
+        self.failed = deque(maxlen=50)   # 最終的に失敗した PendingWrite（新しいものが後ろ）
+        self.batches = 0                 # 実行した書き込み（通信）の回数
+
+    # --- 書き込みの受付 ---
+    def insert(self, table, records):
+        return self._submit(PendingWrite(table, 'insert', list(records)))
+
+    def delete(self, table, ids):
+        return self._submit(PendingWrite(table, 'delete', list(ids)))
+
+    def _submit(self, pending):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("WriteQueue is closed")
+            self._queue.append(pending)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="write-queue", daemon=True)
+                self._worker.start()
+            self._cond.notify()
+        return pending
+
+    def pending(self):
+        """まだ終わっていない書き込みの件数"""
+        with self._cond:
+            return len(self._queue) + self._in_flight
+
+    def flush(self, timeout=None):
+        """キューが空になるまで待つ（timeout 秒で諦めたら False）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """
+        新しい書き込みの受付をやめて、溜まっている分を書き終えたらワーカーのスレッドを止める
+        （st.cache_resource から外れたときに呼ぶ）。timeout 秒で書き終わらなければ False。
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            worker = self._worker
+        if worker is not None and worker is not threading.current_thread():
+            worker.join(timeout)
+            return not worker.is_alive()
+        return True
+
+    # --- バックグラウンドの実行 ---
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    if self._closed:
+                        return
+                    self._cond.wait()
+            # 続けて来る書き込みを少しだけ待ってからまとめる
+            time.sleep(self.linger)
+            with self._cond:
+                batch = list(self._queue)
+                self._queue.clear()
+                self._in_flight = len(batch)
+            try:
+                self._execute(batch)
+            finally:
+                with self._cond:
+                    self._in_flight = 0
+                    self._cond.notify_all()
+
+    def _execute(self, batch):
+        tables = list(dict.fromkeys(p.table for p in batch))
+        for table in tables:
+            inserts = [p for p in batch if p.table == table and p.kind == 'insert']
+            deletes = [p for p in batch if p.table == table and p.kind == 'delete']
+            # 追加を先に（同じ周期で追加した行の削除は id が分かってからなので、順番はこれで足りる）
+            for chunk in _chunks(inserts, self.max_batch):
+                self._insert_chunk(table, chunk)
+            if deletes:
+                self._delete_all(table, deletes)
+
+    def _insert_chunk(self, table, chunk):
+        records = [r for p in chunk for r in p.payload]
+        try:
+            rows = self._call(self._insert_rows, table, records, idempotent=False)
+        except Exception as e:
+            # 通信の失敗（書き込めたかどうか分からないものも含む）は、1件ずつやり直すと重複しうるのでそのまま失敗にする
+            if len(chunk) == 1 or is_transient(e):
+                for p in chunk:
+                    self._fail(p, e)
+                return
+            # まとめたせいで他の人の行まで失敗しないよう、1件ずつやり直す
+            for p in chunk:
+                self._insert_chunk(table, [p])
+            return
+        rows = rows or []
+        if len(chunk) == 1:
+            chunk[0]._finish(result=rows)
+            return
+        # 返ってきた行は送った順に並んでいるので、件数で切り分けて返す
+        start = 0
+        for p in chunk:
+            n = len(p.payload)
+            p._finish(result=rows[start:start + n] if len(rows) == len(records) else None)
+            start += n
+
+    def _delete_all(self, table, deletes):
+        ids = list(dict.fromkeys(i for p in deletes for i in p.payload))
+        try:
+            self._call(self._delete_rows, table, ids)
+        except Exception as e:
+            for p in deletes:
+                self._fail(p, e)
+            return
+        for p in deletes:
+            p._finish()
+
+    def _call(self, func, table, payload, idempotent=True):
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.batches += 1
+                return func(table, payload)
+            except Exception as e:
+                if attempt == self.max_retries or not is_transient(e, idempotent):
+                    raise
+                logger.warning("Write to %s failed (%s), retrying in %.1fs", table, e, delay)
+                time.sleep(delay)
+                delay *= 2
+
+    def _fail(self, pending, error):
+        logger.error("Write to %s failed: %s", pending.table, error, exc_info=error)
+        self.failed.append(pending)
+        pending._finish(error=error)
+
+
+def _run_callback(fn, pending):
+    # 反映に失敗してもキューは止めない（キャッシュは次の同期で追いつく）
+    try:
+        fn(pending)
+    except Exception:
+        logger.exception("Applying write to %s failed", pending.table)
+
+
+def _chunks(pendings, max_rows):
+    # 1回の insert が max_rows 行を超えないように、書き込み単位のまま分ける
+    chunk, rows = [], 0
+    for p in pendings:
+        if chunk and rows + len(p.payload) > max_rows:
+            yield chunk
+            chunk, rows = [], 0
+        chunk.append(p)
+        rows += len(p.payload)
+    if chunk:
+        yield chunk
@@ -0,0 +1,205 @@
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+# インスタの1プロフィールあたりに見る投稿数
+DEFAULT_POST_LIMIT = 3
+# 巡回するのはこのホストのURLだけ
+INSTAGRAM_HOSTS = ("instagram.com", "www.instagram.com")
+# 投稿一覧は1回の通信でこの件数ずつ届く（instaloader の1ページ分）
+POSTS_PER_PAGE = 12
+# 固定表示できる投稿の最大数。固定かどうか分からない投稿は、先頭からこの件数までは古くても読み飛ばす
+MAX_PINNED = 3
+
+
+@dataclass
+class Post:
+    post_id: int      # 新しい投稿ほど大きい（instaloader の mediaid）
+    caption: str
+    pinned: bool = None  # 固定表示か（分からなければ None）
+
+
+class TokenBucket:
+    """
+    ホストごとのレート制限。rate 件/秒 で補充、最大 capacity 件までまとめて使える。
+    acquire はトークンが空いたら返る（スレッドセーフ）。
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class InstaloaderSource:
+    """instaloader で投稿を取る。Instaloader（セッション）は全ワーカーで1つを共有する"""
+
+    host = "www.instagram.com"
+
+    def __init__(self):
+        import instaloader
+        self._instaloader = instaloader
+        self._loader = instaloader.Instaloader()
+
+    def iter_posts(self, username, throttle):
+        """新しい順に投稿を返す。通信（プロフィール・投稿1ページ）の前に throttle() を呼ぶ"""
+        throttle()
+        profile = self._instaloader.Profile.from_username(self._loader.context, username)
+        posts = profile.get_posts()
+        for i in itertools.count():
+            if i % POSTS_PER_PAGE == 0:
+                throttle()  # 次のページの取得（1ページ内の投稿は取得済みなので数えない）
+            post = next(posts, None)
+            if post is None:
+                return
+            yield Post(post.mediaid, post.caption or "", getattr(post, "is_pinned", None))
+
+
+class FakePostSource:
+    """
+    ローカル確認用の投稿ソース。{username: [Post, ...]}（新しい順）を返すだけ。
+    InstaloaderSource と同じく、プロフィールと投稿 page_size 件ごとに1回通信した扱い（delay 秒待つ）にする。
+    """
+
+    host = "fake.local"
+
+    def __init__(self, posts_by_user, delay=0.0, page_size=POSTS_PER_PAGE):
+        self.posts_by_user = posts_by_user
+        self.delay = delay
+        self.page_size = page_size
+        self.calls = []
+        self.requests = 0
+
+    def _request(self, throttle):
+        throttle()
+        self.requests += 1
+        time.sleep(self.delay)
+
+    def iter_posts(self, username, throttle):
+        self.calls.append(username)
+        self._request(throttle)
+        for i, post in enumerate(self.posts_by_user.get(username, [])):
+            if i % self.page_size == 0:
+                self._request(throttle)
+            yield post
+
+
+class CursorStore:
+    """ジムごとの「最後に見た投稿ID」をJSONファイルに保存する"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._cursors = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._cursors = json.load(f)
+
+    def get(self, gym_name):
+        with self._lock:
+            return self._cursors.get(gym_name)
+
+    def advance(self, gym_name, post_id):
+        with self._lock:
+            if post_id > self._cursors.get(gym_name, -1):
+                self._cursors[gym_name] = post_id
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._cursors, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+
+
+def get_username_from_url(url):
+    """URLからユーザー名を抽出"""
+    # https://www.instagram.com/username/ -> username
+    if not url:
+        return None
+    url = url.strip().split('?')[0]
+    if '://' not in url:
+        url = 'https://' + url  # instagram.com/username のようにスキーム抜きでも読めるように
+    parsed = urlparse(url)
+    # インスタ以外のURL（ジムの公式サイトなど）は対象外
+    if (parsed.hostname or '').lower() not in INSTAGRAM_HOSTS:
+        return None
+    path = parsed.path.strip('/')
+    return path.split('/')[0] if path else None
+
+
+class Crawler:
+    """
+    ジムのインスタを並列に巡回して、前回以降の新しい投稿だけを返す。
+    ワーカー数は max_workers まで、同じホストへの通信は TokenBucket で rate_per_sec 件/秒に抑える
+    （burst は既定で max_workers なので、ワーカーどうしの通信は重なって進む）。
+    前回見た投稿（カーソル）まで来たらそれ以上は取りに行かない。
+    カーソルはメモリ上で進めるだけなので、保存できたら呼び出し側で cursors.save() する。
+    """
+
+    def __init__(self, source, cursors, max_workers=4, rate_per_sec=1.0, burst=None, limit=DEFAULT_POST_LIMIT):
+        self.source = source
+        self.cursors = cursors
+        self.max_workers = max_workers
+        self.limit = limit
+        self._bucket_args = (rate_per_sec, burst or max_workers)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, host):
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(*self._bucket_args)
+            return self._buckets[host]
+
+    def _crawl_one(self, gym):
+        name, url = gym['gym_name'], gym['instagram_url']
+        username = get_username_from_url(url)
+        if not username:
+            print(f"Invalid URL: {url}")
+            return name, []
+        bucket = self._bucket(getattr(self.source, "host", None) or urlparse(url).netloc)
+        last_seen = self.cursors.get(name)
+        new_posts = []
+        try:
+            for i, p in enumerate(self.source.iter_posts(username, bucket.acquire)):
+                if last_seen is None or p.post_id > last_seen:
+                    new_posts.append(p)
+                elif not (p.pinned or (p.pinned is None and i < MAX_PINNED)):
+                    # ここから先は前回までに見た投稿（固定表示の古い投稿は先頭に来るので読み飛ばす）
+                    break
+                if i + 1 >= self.limit:
+                    break  # 次のページを取りに行かないように、取り終えた時点で止める
+        except Exception as e:
+            print(f"Error fetching {username}: {e}")
+            return name, []
+        for p in new_posts:
+            self.cursors.advance(name, p.post_id)
+        return name, new_posts
+
+    def crawl(self, gyms):
+        """gyms: [{'gym_name': ..., 'instagram_url': ...}] -> [(gym_name, [Post, ...]), ...]"""
+        targets = [g for g in gyms if g.get('instagram_url')]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(self._crawl_one, targets))
@@ -1,7 +1,8 @@
 import streamlit as st
 import pandas as pd
 from datetime import timedelta
-from utils import get_supabase_data, safe_save, init_connection, get_now_jp
+from core import profiler
+from utils import get_tables, get_gym_options, safe_save, init_connection, get_now_jp
 
 def show_page():
     # --- 初期定義 (元のコードそのまま) ---
@@ -10,26 +11,16 @@ def show_page():
     today_ts = pd.Timestamp(today_jp)
     
     # データの取得 (元のコードそのまま)
-    gym_df = get_supabase_data("gym_master")
-    sched_df = get_supabase_data("set_schedules")
-    log_df = get_supabase_data("climbing_logs")
-    user_df = get_supabase_data("users")
-    area_master = get_supabase_data("area_master")
+    # gym_master・set_schedules はここでは読まないが、登録したときに safe_save が
+    # 手元のコピーへ先に反映できる（画面に戻っても取り直さない）ようにロードしておく
+    area_master = get_tables(["gym_master", "set_schedules", "area_master"]).area_master
     
     st.query_params["tab"] = "⚙️ 管理"
 
-    # データの準備（エリア情報を付与したジムリストを作成）
-    if not gym_df.empty and not area_master.empty:
-        # gym_df と area_master を area_tag で結合
-        m_gyms_admin = pd.merge(gym_df, area_master[['area_tag', 'major_area']], on='area_tag', how='left')
-        # 表示順を整える
-        custom_order = ["都内・神奈川", "関東", "関西", "全国"]
-        actual_areas = [a for a in m_gyms_admin['major_area'].unique() if pd.notna(a)]
-        all_areas_admin = [a for a in custom_order if a in actual_areas]
-        all_areas_admin += [a for a in actual_areas if a not in custom_order]
-    else:
-        m_gyms_admin = pd.DataFrame()
-        all_areas_admin = []
+    # データの準備（エリアタブとジムの選択肢。直近1ヶ月の訪問実績があるジムには🌟）
+    one_month_ago = pd.Timestamp(today_jp) - timedelta(days=30)
+    gym_options_admin = get_gym_options(st.session_state.USER, one_month_ago, "🌟")
+    all_areas_admin = gym_options_admin["areas"]
 
     # --- 🆕 ジム登録 ---
     with st.expander("🆕 ジムの新規登録"):
@@ -56,42 +47,20 @@ def show_page():
                     
     # --- 📅 2. セットスケジュール登録 ---
     with st.expander("📅 セットスケジュール登録", expanded=False):
-        
-        # 💡 【追加】直近1ヶ月の訪問実績を特定（管理画面用）
-        recent_gyms_admin = []
-        if not log_df.empty:
-            one_month_ago = pd.Timestamp(today_jp) - timedelta(days=30)
-            recent_gyms_admin = log_df[
-                (log_df['user'] == st.session_state.USER) & 
-                (log_df['type'] == '実績') & 
-                (log_df['date'] >= one_month_ago)
-            ]['gym_name'].unique().tolist()
 
         st.write("### 1. 対象ジムを選択")
         selected_gym_set = None
-        if not m_gyms_admin.empty:
+        if all_areas_admin:
             admin_set_tabs = st.tabs(all_areas_admin)
             
             for i, area in enumerate(all_areas_admin):
                 with admin_set_tabs[i]:
-                    raw_area_gyms = sorted(m_gyms_admin[m_gyms_admin['major_area'] == area]['gym_name'].unique().tolist())
+                    label_map_admin = gym_options_admin["options"].get(area, {})
                     
-                    if raw_area_gyms:
-                        # 💡 表示用ラベルの作成
-                        display_options_admin = []
-                        label_map_admin = {}
-                        
-                        for g_name in raw_area_gyms:
-                            if g_name in recent_gyms_admin:
-                                label = f"{g_name} 🌟"
-                            else:
-                                label = f"{g_name}"
-                            display_options_admin.append(label)
-                            label_map_admin[label] = g_name
-
+                    if label_map_admin:
                         res_label = st.radio(
                             f"{area}のジムを選択",
-                            options=display_options_admin,
+                            options=list(label_map_admin),
                             index=None,
                             key=f"radio_admin_set_{area}",
                             label_visibility="collapsed"
@@ -152,6 +121,35 @@ def show_page():
             st.session_state.rows += 1
             st.rerun()
             
+    # --- ⏱️ パフォーマンス計測 ---
+    with st.expander("⏱️ パフォーマンス計測", expanded=False):
+        on = st.toggle("計測する（全ユーザーのページ表示を記録）", value=profiler.enabled(), key="adm_profile_on")
+        if on != profiler.enabled():
+            profiler.set_enabled(on)
+        traces = profiler.recent_traces()
+        if not traces:
+            st.caption("まだ記録がありません。計測をオンにしてページを表示すると、ここに出ます。")
+        else:
+            summary = pd.DataFrame([
+                {
+                    "page": t.page,
+                    "at": pd.Timestamp(t.started_at, unit="s", tz="Asia/Tokyo").strftime("%H:%M:%S"),
+                    "total_ms": round(t.seconds * 1000, 1),
+                    **{f"{kind}_ms": round(sum(s.seconds for s in t.stages if s.kind == kind) * 1000, 1)
+                       for kind in ("fetch", "transform", "render")},
+                    "rows": sum(s.rows or 0 for s in t.stages),
+                    **t.counts,
+                }
+                for t in traces
+            ]).fillna(0)
+            st.dataframe(summary, hide_index=True, use_container_width=True)
+            latest = traces[0]
+            st.caption(f"直近（{latest.page}）の段階別")
+            st.dataframe(pd.DataFrame(latest.to_dict()["stages"]), hide_index=True, use_container_width=True)
+            if st.button("記録をクリア", key="adm_profile_clear"):
+                profiler.clear()
+                st.rerun()
+
     # --- 🚪 3. ログアウト ---
     st.divider()
     if st.button("🚪 ログアウト", use_container_width=True): 
@@ -2,17 +2,25 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 # utils.py から必要な機能をインポート
-from utils import get_supabase_data, safe_save, get_now_jp
+from utils import query_supabase_data, get_table_version, safe_save, get_now_jp, render_html_list
+from core.views import build_dashboard_view
+
+@st.cache_data(ttl=60, max_entries=32, show_spinner=False)
+def _dashboard_view(log_version, user, start, end):
+    # log_version はキャッシュキー専用（ログが変わると作り直しになる）
+    # 自分のログだけをSupabase側で絞り込む
+    log_df = query_supabase_data(
+        "climbing_logs",
+        columns=["id", "date", "gym_name", "type", "time_slot"],
+        eq={"user": user},
+    )
+    return build_dashboard_view(log_df, start, end)
 
 def show_page():
     # --- 初期定義 (元のコードそのまま) ---
     now_jp = get_now_jp()
     today_jp = now_jp.date()
     
-    # データの取得 (元のコードそのまま)
-    log_df = get_supabase_data("climbing_logs")
-    user_df = get_supabase_data("users")
-    
     # 未ログイン時のガード（念のため）
     if st.session_state.USER is None:
         st.warning("ログインしてください")
@@ -30,38 +38,23 @@ def show_page():
     me_ts = pd.Timestamp(me)
     
     # --- 2. データの抽出 ---
-    if not log_df.empty:
-        # 【実績】は期間で絞り込む
-        filtered_done = log_df[
-            (log_df['user'] == st.session_state.USER) & 
-            (log_df['type'] == '実績') & 
-            (log_df['date'] >= ms_ts) & 
-            (log_df['date'] <= me_ts)
-        ].sort_values('date', ascending=False)
-        
-        # 【予定】は期間に関係なく自分のものを全件出す
-        all_my_plans = log_df[
-            (log_df['user'] == st.session_state.USER) & 
-            (log_df['type'] == '予定')
-        ].sort_values('date') # 予定なので日付順
-    else:
-        filtered_done = pd.DataFrame()
-        all_my_plans = pd.DataFrame()
+    # 【実績】は期間で絞り込み、【予定】は期間に関係なく自分のものを全件（日付順）
+    # ログの世代・ユーザー・期間が同じなら集計し直さない
+    view = _dashboard_view(get_table_version("climbing_logs"), st.session_state.USER, ms_ts, me_ts)
+    filtered_done, all_my_plans = view["done"], view["plans"]
     
     # --- 3. 統計グラフの表示（ここは実績ベース） ---
     if not filtered_done.empty:
         st.markdown(f'''
             <div class="insta-card">
                 <div style="display: flex; justify-content: space-around;">
-                    <div><div class="insta-val">{len(filtered_done)}</div><div class="insta-label">Sessions</div></div>
-                    <div><div class="insta-val">{filtered_done["gym_name"].nunique()}</div><div class="insta-label">Gyms</div></div>
+                    <div><div class="insta-val">{view["sessions"]}</div><div class="insta-label">Sessions</div></div>
+                    <div><div class="insta-val">{view["gyms"]}</div><div class="insta-label">Gyms</div></div>
                 </div>
             </div>
         ''', unsafe_allow_html=True)
         
-        counts = filtered_done['gym_name'].value_counts().reset_index()
-        counts.columns = ['gym_name', 'count']
-        counts = counts.sort_values('count', ascending=True)
+        counts = view["gym_counts"]
         
         fig = px.bar(counts, x='count', y='gym_name', orientation='h', text='count', 
                      color='count', color_continuous_scale='Sunsetdark')
@@ -123,52 +116,39 @@ def show_page():
         if all_my_plans.empty:
             st.caption("予定はありません。")
         else:
-            for _, row in all_my_plans.iterrows():
-                # アイコンの取得
-                ts = row.get('time_slot')
-                icon_html = icon_map.get(ts, "") # なければ空文字
-                                                
-                c1, c2 = st.columns([0.88, 0.12])  
-                with c1:
-                    st.markdown(f'''
-                        <div style="display: flex; align-items: center; padding: 6px 0; border-bottom: 1px solid #eee; gap: 10px;">
-                            <div style="background:#4CAF50; width:4px; height:20px; border-radius:2px; flex-shrink:0;"></div>
-                            <div style="min-width: 45px; font-size: 0.85rem; font-weight: bold; color: #666;">{row["date"].strftime("%m/%d")}</div>
-                            <div style="min-width: 25px; display: flex; justify-content: center;">{icon_html}</div>
-                            <div style="flex-grow: 1; font-size: 0.9rem; color: #333; white-space: nowrap; overflow: hidden; text-overflow: ellipsis;">
-                                {row["gym_name"]}
-                            </div>
-                        </div>
-                    ''', unsafe_allow_html=True)
-                
-                with c2:
-                    # ボタンの上の余白を調整して中心に合わせる
-                    if st.button("🗑️", key=f"del_p_{row['id']}"):
-                        safe_save("climbing_logs", row['id'], mode="delete", target_tab="📊 マイページ")
+            render_html_list(_log_rows_html(all_my_plans, "#4CAF50", icon_map), page_size=50, key="plan_list_page")
+            _delete_picker(all_my_plans, key="del_p")
 
     with m_tabs[1]: # 実績タブ：期間連動
         if filtered_done.empty:
             st.caption(f"{ms.strftime('%m/%d')}〜{me.strftime('%m/%d')} の実績はありません。")
         else:
-            for _, row in filtered_done.iterrows():
-                # アイコンの取得
-                ts = row.get('time_slot')
-                icon_html = icon_map.get(ts, "") # なければ空文字
-                
-                c1, c2 = st.columns([0.88, 0.12])  
-                with c1:
-                    st.markdown(f'''
-                        <div style="display: flex; align-items: center; padding: 6px 0; border-bottom: 1px solid #eee; gap: 10px;">
-                            <div style="background:#DD2476; width:4px; height:20px; border-radius:2px; flex-shrink:0;"></div>
-                            <div style="min-width: 45px; font-size: 0.85rem; font-weight: bold; color: #666;">{row["date"].strftime("%m/%d")}</div>
-                            <div style="min-width: 25px; display: flex; justify-content: center;">{icon_html}</div>
-                            <div style="flex-grow: 1; font-size: 0.9rem; color: #333; white-space: nowrap; overflow: hidden; text-overflow: ellipsis;">
-                                {row["gym_name"]}
-                            </div>
-                        </div>
-                    ''', unsafe_allow_html=True)
-                
-                with c2:
-                    # ボタンの上の余白を調整して中心に合わせる
-                    if st.button("🗑️", key=f"del_d_{row['id']}"):
-                        safe_save("climbing_logs", row['id'], mode="delete", target_tab="📊 マイページ")
+            render_html_list(_log_rows_html(filtered_done, "#DD2476", icon_map), page_size=50, key="done_list_page")
+            _delete_picker(filtered_done, key="del_d")
+
+
+def _log_rows_html(df, accent_color, icon_map):
+    # アイコンの取得（なければ空文字）
+    icon_html = df['time_slot'].astype(object).map(icon_map).fillna("").astype(str)
+    return (
+        '<div style="display: flex; align-items: center; padding: 6px 0; border-bottom: 1px solid #eee; gap: 10px;">'
+        f'<div style="background:{accent_color}; width:4px; height:20px; border-radius:2px; flex-shrink:0;"></div>'
+        '<div style="min-width: 45px; font-size: 0.85rem; font-weight: bold; color: #666;">' + df['date'].dt.strftime("%m/%d") + '</div>'
+        '<div style="min-width: 25px; display: flex; justify-content: center;">' + icon_html + '</div>'
+        '<div style="flex-grow: 1; font-size: 0.9rem; color: #333; white-space: nowrap; overflow: hidden; text-overflow: ellipsis;">'
+        + df['gym_name'].astype(str) +
+        '</div>'
+        '</div>'
+    )
+
+
+def _delete_picker(df, key):
+    # 行ごとのボタンの代わりに、削除する記録を選んで1つのボタンで削除する
+    labels = dict(zip(df['id'].tolist(), df['date'].dt.strftime("%m/%d") + " " + df['gym_name'].astype(str)))
+    c1, c2 = st.columns([0.75, 0.25], vertical_alignment="bottom")
+    target_id = c1.selectbox(
+        "削除する記録", options=list(labels), index=None, format_func=labels.get,
+        placeholder="削除する記録を選択", key=f"{key}_select", label_visibility="collapsed",
+    )
+    if c2.button("🗑️ 削除", key=f"{key}_btn", use_container_width=True, disabled=target_id is None):
+        safe_save("climbing_logs", target_id, mode="delete", target_tab="📊 マイページ")
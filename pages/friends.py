@@ -2,7 +2,26 @@ import streamlit as st
 import pandas as pd
 from datetime import timedelta
 # utils.py から必要な機能をインポート
-from utils import get_supabase_data, get_now_jp, get_colored_user_text
+from utils import get_tables, query_supabase_data, table_has_rows, get_table_version, get_now_jp, get_user_profiles, render_html_list
+from core.views import build_friend_plans
+
+@st.cache_data(ttl=60, max_entries=32, show_spinner=False)
+def _friend_plans(log_version, user_version, user, include_me, today):
+    # *_version はキャッシュキー専用（ログ・ユーザーが変わると作り直しになる）
+    # ログは直近30日の予定だけをSupabase側で絞り込む
+    lower_bound = pd.Timestamp(today)
+    upper_bound = lower_bound + timedelta(days=30)
+    log_df = query_supabase_data(
+        "climbing_logs",
+        columns=["user", "gym_name", "date"],
+        eq={"type": "予定"},
+        gte={"date": lower_bound},
+        lte={"date": upper_bound},
+    )
+    if log_df.empty and not table_has_rows("climbing_logs"):
+        # ログ自体がない（期間内に予定がないだけなら空の一覧を返す）
+        return None
+    return build_friend_plans(log_df, user, include_me, get_user_profiles())
 
 def show_page():
     # --- 初期定義 (元のコードそのまま) ---
@@ -10,10 +29,6 @@ def show_page():
     today_jp = now_jp.date()
     today_ts = pd.Timestamp(today_jp)
     
-    # データの取得
-    log_df = get_supabase_data("climbing_logs")
-    user_df = get_supabase_data("users")
-    
     # 未ログイン時のガード
     if st.session_state.USER is None:
         st.warning("ログインしてください")
@@ -25,53 +40,29 @@ def show_page():
     # 1. 表示オプション
     include_me = st.toggle("自分の予定も表示する", value=False, key="check_include_me")
     
-    # 2. データの抽出
-    if not log_df.empty:
-        # 基本条件：予定であること ＆ 今日以降の予定であること
-        # (SupabaseのdateはTimestamp型なので、today_jpをTimestampに変換して比較)
-        lower_bound = pd.Timestamp(today_jp)
-        upper_bound = lower_bound + timedelta(days=30)
-        
-        condition = (log_df['type'] == '予定') & \
-                    (log_df['date'] >= lower_bound) & \
-                    (log_df['date'] <= upper_bound)
-        
-        # 自分を含めない設定なら除外
-        if not include_me:
-            condition = condition & (log_df['user'] != st.session_state.USER)
-            
-        o_plans = log_df[condition].sort_values('date')
-        
-        # 3. 表示ループ
+    # 2. データの抽出（予定・期間の条件は取得時に適用済み、自分を含めない設定なら除外）
+    # ユーザーのアイコン・色と自分の目印も付けて、ログ・ユーザーの世代ごとに1回だけ作る
+    get_tables(["users"])  # ロードしてから世代をキーにする
+    o_plans = _friend_plans(
+        get_table_version("climbing_logs"), get_table_version("users"),
+        st.session_state.USER, include_me, today_jp,
+    )
+    if o_plans is not None:
+        # 3. 表示（1ページ分の行をまとめて1回で描画）
         if not o_plans.empty:
-            for _, row in o_plans.iterrows():
-                # ユーザー情報を users テーブルから取得 (user_name で紐付け)
-                u_info = user_df[user_df['user_name'] == row['user']] if not user_df.empty else pd.DataFrame()
-                
-                if not u_info.empty:
-                    u_color = u_info.iloc[0]['color']
-                    u_icon = u_info.iloc[0]['icon']
-                else:
-                    # 万が一ユーザーが見つからない場合のデフォルト
-                    u_color = "#CCC"
-                    u_icon = "👤"
-                
-                # 自分自身の予定には目印をつける
-                is_me = row['user'] == st.session_state.USER
-                display_name = f"{row['user']} (自分)" if is_me else row['user']
-                
-                st.markdown(f'''
-                    <div class="item-box">
-                        <div class="item-accent" style="background:{u_color} !important"></div>
-                        <span class="item-date">{row["date"].strftime("%m/%d")}</span>
-                        <span class="item-gym">
-                            <span style="font-size:1.1rem; margin-right:4px;">{u_icon}</span>
-                            <b style="color:{u_color if is_me else '#1A1A1A'};">{display_name}</b> 
-                            <span style="font-size:0.8rem; color:#666; margin-left:8px;">@{row["gym_name"]}</span>
-                        </span>
-                        <div></div>
-                    </div>
-                ''', unsafe_allow_html=True)
+            rows_html = (
+                '<div class="item-box">'
+                '<div class="item-accent" style="background:' + o_plans['color'] + ' !important"></div>'
+                '<span class="item-date">' + o_plans['date'].dt.strftime("%m/%d") + '</span>'
+                '<span class="item-gym">'
+                '<span style="font-size:1.1rem; margin-right:4px;">' + o_plans['icon'] + '</span>'
+                '<b style="color:' + o_plans['name_color'] + ';">' + o_plans['display_name'] + '</b> '
+                '<span style="font-size:0.8rem; color:#666; margin-left:8px;">@' + o_plans['gym_name'] + '</span>'
+                '</span>'
+                '<div></div>'
+                '</div>'
+            )
+            render_html_list(rows_html, page_size=50, key="friends_list_page")
         else:
             st.info("期間内に仲間の予定は見つかりませんでした。")
     else:
@@ -3,16 +3,47 @@ import pandas as pd
 from datetime import datetime
 from datetime import timedelta
 # utils.py から必要な機能をインポート
-from utils import get_supabase_data, get_now_jp
+from utils import get_tables, get_table_version, get_gym_schedule_index, get_visit_index, get_now_jp, render_html_list
+from core.recommend import recommend_gyms
+from core.views import build_gym_list
+
+_TABLES = ["gym_master", "area_master", "climbing_logs", "set_schedules"]
+
+def _versions():
+    return tuple(get_table_version(t) for t in _TABLES)
+
+@st.cache_data(ttl=60, max_entries=32, show_spinner=False)
+def _recommendations(versions, user, t_dt, major_choice):
+    # versions はキャッシュキー専用（ジム・ログ・スケジュールが変わると作り直しになる）
+    tables = get_tables(_TABLES)
+    gym_df, area_master = tables.gym_master, tables.area_master
+    if gym_df.empty:
+        return pd.DataFrame()
+    # マスタから対象エリアタグを抽出
+    if major_choice == "全国":
+        allowed_tags = gym_df['area_tag'].unique().tolist()
+    else:
+        allowed_tags = area_master[area_master['major_area'] == major_choice]['area_tag'].tolist() if not area_master.empty else []
+    return recommend_gyms(
+        gym_df, tables.set_schedules, tables.climbing_logs, user, t_dt,
+        allowed_tags=allowed_tags, top_k=5, sched_index=get_gym_schedule_index(tables.set_schedules),
+    )
+
+@st.cache_data(ttl=60, max_entries=32, show_spinner=False)
+def _gym_list(versions, user, month_start):
+    # versions はキャッシュキー専用
+    tables = get_tables(_TABLES)
+    last_visits = get_visit_index().last_visits(user)
+    sched_gyms = get_gym_schedule_index(tables.set_schedules).gyms_with_start_since(month_start)
+    return build_gym_list(tables.gym_master, last_visits, sched_gyms)
 
 def show_page():
     from utils import get_now_jp
     
     # --- 初期定義 (元のコードそのまま) ---
-    gym_df = get_supabase_data("gym_master")
-    area_master = get_supabase_data("area_master")
-    log_df = get_supabase_data("climbing_logs")
-    sched_df = get_supabase_data("set_schedules")
+    # ロード・同期してから世代を読む（読んだあとに世代が進むと次の再実行でキャッシュが外れる）
+    gym_df = get_tables(_TABLES).gym_master
+    versions = _versions()
 
     # 日付計算の準備
     now_jp = get_now_jp()
@@ -34,94 +65,17 @@ def show_page():
     # 2. エリア選択（ラジオボタン）
     major_choice = st.radio("表示範囲", ["都内・神奈川", "関東", "全国"], horizontal=True, index=0)
     
-    # 3. マスタから対象エリアタグを抽出
-    if major_choice == "全国":
-        allowed_tags = gym_df['area_tag'].unique().tolist() if not gym_df.empty else []
-    else:
-        # area_master も取得済みであることが前提
-        allowed_tags = area_master[area_master['major_area'] == major_choice]['area_tag'].tolist() if not area_master.empty else []
-    
-    # 4. スコアリングロジック
-    ranked_list = []
+    # 3-4. 対象エリアで全ジムをまとめてスコアリングして上位5件を取得
+    # （データの世代・ユーザー・ターゲット日・エリアが同じなら再計算しない）
     if not gym_df.empty:
-        for _, gym in gym_df.iterrows():
-            # エリアフィルタ
-            if gym['area_tag'] not in allowed_tags:
-                continue
-    
-            name, score, reasons = gym['gym_name'], 0, []
-    
-            # --- 🆕 追加：既訪フィルタ (セット後に訪問済みなら非表示) ---
-            # 1. このジムの最新セット日を取得
-            latest_set_date = None
-            if not sched_df.empty:
-                gym_sets = sched_df[(sched_df['gym_name'] == name) & (sched_df['end_date'] <= t_dt)]
-                if not gym_sets.empty:
-                    latest_set_date = gym_sets['end_date'].max().date()
-    
-            # 2. 自分のこのジムへの最新訪問日を取得
-            latest_visit_date = None
-            if not log_df.empty:
-                my_visits = log_df[
-                    (log_df['gym_name'] == name) & 
-                    (log_df['user'] == st.session_state.USER) & 
-                    (log_df['type'] == '実績')
-                ]
-                if not my_visits.empty:
-                    latest_visit_date = my_visits['date'].max().date()
-    
-            # 3. 判定：最新セット日よりも後に訪問していたらスキップ
-            if latest_set_date and latest_visit_date:
-                if latest_visit_date >= latest_set_date:
-                    continue  # すでに登り済みなのでおすすめに出さない
-    
-            # --- ① 鮮度スコア（セット終了日基準） ---
-            if latest_set_date:
-                diff = (t_dt.date() - latest_set_date).days
-                if 1 <= diff <= 7: 
-                    score += 40
-                    reasons.append(f"🔥 新セット({diff}日前)")
-                elif 8 <= diff <= 14: 
-                    score += 30
-                    reasons.append(f"✨ 準新セット({diff}日前)")
-    
-            # --- ② 仲間スコア ---
-            if not log_df.empty:
-                others = log_df[
-                    (log_df['gym_name'] == name) & 
-                    (log_df['user'] != st.session_state.USER) & 
-                    (log_df['type'] == '予定') & 
-                    (log_df['date'] == t_dt)
-                ]
-                if not others.empty:
-                    score += 15
-                    reasons.append(f"👥 仲間{len(others)}名")
-                
-            # --- ③ 実績スコア ---
-            if not latest_visit_date:
-                score += 10
-                reasons.append("🆕 未訪問")
-            else:
-                last_v_days = (t_dt.date() - latest_visit_date).days
-                if last_v_days >= 30: 
-                    score += 20
-                    reasons.append(f"⌛ {last_v_days}日ぶり")
-    
-            if reasons:
-                default_date = pd.Timestamp("2000-01-01").date()
-                ranked_list.append({
-                    "name": name, "score": score, "reasons": reasons, 
-                    "area": gym['area_tag'], "url": gym['profile_url'],
-                    "latest_set_date": latest_set_date if latest_set_date else default_date
-                })
+        top_gyms = _recommendations(versions, st.session_state.USER, t_dt, major_choice)
                 
         # 5. スコア上位表示
-        if ranked_list:
-            sorted_gyms = sorted(
-                ranked_list, 
-                key=lambda x: (x['score'], x['latest_set_date']), 
-                reverse=True
-            )[:5]
+        if not top_gyms.empty:
+            sorted_gyms = [
+                {"name": r.gym_name, "reasons": r.reasons, "area": r.area_tag, "url": r.profile_url}
+                for r in top_gyms.itertuples(index=False)
+            ]
             
             for gym in sorted_gyms:
                 # タグ生成
@@ -150,46 +104,11 @@ def show_page():
     st.subheader("🏢 ジム一覧")
     if not gym_df.empty:
         # --- 1. データの準備 ---
-        my_done_logs = log_df[(log_df['user'] == st.session_state.USER) & (log_df['type'] == '実績')] if not log_df.empty else pd.DataFrame()
-        
-        # ジムごとに最新訪問日を辞書化
-        last_visit_dict = {}
-        if not my_done_logs.empty:
-            last_visit_dict = my_done_logs.groupby('gym_name')['date'].max().to_dict()
-    
-        # 訪問済みと未訪問に分けるリスト
-        visited_list = []
-        unvisited_list = []
-        
         # 今月の開始日を取得（2026-02-01）
         this_month_start = t_dt.replace(day=1).date()
     
-        for _, row in gym_df.iterrows():
-            g_name = row['gym_name']
-            
-            # --- 今月のセットスケジュールがあるかチェック ---
-            has_sched = False
-            if not sched_df.empty:
-                has_sched = not sched_df[
-                    (sched_df['gym_name'] == g_name) & 
-                    (sched_df['start_date'] >= pd.Timestamp(this_month_start))
-                ].empty
-    
-            gym_data = {
-                "name": g_name,
-                "area": row['area_tag'],
-                "url": row.get('profile_url', '#'),
-                "last_date": last_visit_dict.get(g_name),
-                "no_sched": not has_sched  # スケジュールがなければ警告対象
-            }
-    
-            if g_name in last_visit_dict:
-                visited_list.append(gym_data)
-            else:
-                unvisited_list.append(gym_data)
-    
-        # 訪問済みを日付順にソート
-        visited_list.sort(key=lambda x: x['last_date'], reverse=True)
+        # 最終訪問日と今月のセット登録の有無を付けて、訪問済み（日付順）と未訪問に分ける
+        visited, unvisited = _gym_list(versions, st.session_state.USER, this_month_start)
     
         # --- 2. UI表示 ---
         g_tabs = st.tabs(["✅ 訪問済", "🔍 未訪問"])
@@ -207,38 +126,38 @@ def show_page():
         """, unsafe_allow_html=True)
     
         with g_tabs[0]: # 訪問済
-            if not visited_list:
+            if visited.empty:
                 st.caption("まだ訪問実績がありません。")
             else:
-                for g in visited_list:
-                    warn_html = '<span class="warn-tag">⚠️セット未登録</span>' if g['no_sched'] else ''
-                    st.markdown(f'''
-                        <a href="{g['url']}" target="_blank" class="gym-row">
-                            <div class="gym-info">
-                                <span class="gym-n">🔹 {g['name']}{warn_html}</span>
-                                <span class="gym-a">{g['area']}</span>
-                            </div>
-                            <div style="text-align: right;">
-                                <div style="font-size: 0.6rem; color: #888; margin-bottom: -2px;">Last visit</div>
-                                <span class="gym-d">{g['last_date'].strftime("%Y/%m/%d")}</span>
-                            </div>
-                        </a>
-                    ''', unsafe_allow_html=True)
+                warn_html = visited['no_sched'].map({True: '<span class="warn-tag">⚠️セット未登録</span>', False: ''})
+                rows_html = (
+                    '<a href="' + visited['url'].astype(str) + '" target="_blank" class="gym-row">'
+                    '<div class="gym-info">'
+                    '<span class="gym-n">🔹 ' + visited['name'].astype(str) + warn_html + '</span>'
+                    '<span class="gym-a">' + visited['area'].astype(str) + '</span>'
+                    '</div>'
+                    '<div style="text-align: right;">'
+                    '<div style="font-size: 0.6rem; color: #888; margin-bottom: -2px;">Last visit</div>'
+                    '<span class="gym-d">' + visited['last_date'].dt.strftime("%Y/%m/%d") + '</span>'
+                    '</div>'
+                    '</a>'
+                )
+                render_html_list(rows_html)
             
         with g_tabs[1]: # 未訪問
-            if not unvisited_list:
+            if unvisited.empty:
                 st.caption("すべてのジムを制覇しました！")
             else:
-                for g in unvisited_list:
-                    warn_html = '<span class="warn-tag">⚠️予定未登録</span>' if g['no_sched'] else ''
-                    st.markdown(f'''
-                        <a href="{g['url']}" target="_blank" class="gym-row">
-                            <div class="gym-info">
-                                <span class="gym-n">⬜ {g['name']}{warn_html}</span>
-                                <span class="gym-a">{g['area']}</span>
-                            </div>
-                            <span style="font-size: 0.7rem; color: #ccc;">未踏</span>
-                        </a>
-                    ''', unsafe_allow_html=True)
+                warn_html = unvisited['no_sched'].map({True: '<span class="warn-tag">⚠️予定未登録</span>', False: ''})
+                rows_html = (
+                    '<a href="' + unvisited['url'].astype(str) + '" target="_blank" class="gym-row">'
+                    '<div class="gym-info">'
+                    '<span class="gym-n">⬜ ' + unvisited['name'].astype(str) + warn_html + '</span>'
+                    '<span class="gym-a">' + unvisited['area'].astype(str) + '</span>'
+                    '</div>'
+                    '<span style="font-size: 0.7rem; color: #ccc;">未踏</span>'
+                    '</a>'
+                )
+                render_html_list(rows_html)
     else:
         st.info("ジムマスターが空です。管理タブから登録してください。")
@@ -2,7 +2,35 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 from datetime import timedelta
-from utils import get_supabase_data, safe_save, get_now_jp, get_colored_user_text
+from utils import get_tables, get_table_version, get_gym_options, get_monthly_ranking, query_supabase_data, safe_save, get_now_jp, get_user_profiles, format_user_names, render_html_list
+from core.feed import build_plan_feed, TIME_SLOTS
+from core.views import build_ranking_view
+
+# 時間帯ごとのアイコン画像
+FEED_ICON_MAP = {
+    "昼": '<img src="https://github.com/kenta-yos/climbing-schedule-app/blob/develop/images/hiru.png?raw=true" width="16"/>',
+    "夕方": '<img src="https://github.com/kenta-yos/climbing-schedule-app/blob/develop/images/yuu.png?raw=true" width="16"/>',
+    "夜": '<img src="https://github.com/kenta-yos/climbing-schedule-app/blob/develop/images/yoru.png?raw=true" width="16"/>'
+}
+
+@st.cache_data(ttl=10, max_entries=8, show_spinner=False)
+def _plan_feed(log_version, start, end):
+    # log_version はキャッシュキー専用（予定が追加・削除されると作り直しになる）
+    plans = query_supabase_data(
+        "climbing_logs",
+        columns=["user", "gym_name", "date", "time_slot"],
+        eq={"type": "予定"},
+        gte={"date": start},
+        lte={"date": end},
+    )
+    return build_plan_feed(plans)
+
+@st.cache_data(ttl=60, max_entries=8, show_spinner=False)
+def _ranking_view(log_version, user_version, year, month):
+    # *_version はキャッシュキー専用（実績・ユーザーが変わると作り直しになる）
+    profiles = get_user_profiles()
+    ranking = get_monthly_ranking().ranking(year, month, profiles.keys())
+    return build_ranking_view(ranking, profiles)
 
 def show_page():
     from datetime import timedelta
@@ -14,11 +42,8 @@ def show_page():
     this_month = today_jp.month
     
     # データの取得 (元のコードそのまま)
-    gym_df = get_supabase_data("gym_master")
-    sched_df = get_supabase_data("set_schedules")
-    log_df = get_supabase_data("climbing_logs")
-    user_df = get_supabase_data("users")
-    area_master = get_supabase_data("area_master")
+    # ジム・エリアは get_gym_options 側で参照するので、ここではユーザーだけ
+    user_df = get_tables(["users"]).users
     
     # --- 1. ログイン処理 (元のコードそのまま) ---
     if not st.session_state.get('USER'):
@@ -50,11 +75,8 @@ def show_page():
                         
                         if st.button(f"{row['icon']}\n{row['user_name']}", key=btn_key):
                             # アクセス履歴取得
-                            from utils import init_connection
-                            supabase = init_connection()
-                            supabase.table("access_logs")\
-                                .insert({"user_name": row['user_name']})\
-                                .execute()
+                            from utils import insert_rows
+                            insert_rows("access_logs", [{"user_name": row['user_name']}])
                             st.session_state.USER = row['user_name']
                             st.session_state.U_COLOR = row['color']
                             st.session_state.U_ICON = row['icon']
@@ -65,24 +87,9 @@ def show_page():
     col_title, col_btn = st.columns([0.7, 0.3])
     with col_title: st.write(f"🧗 Let's Go Bouldering **{st.session_state.U_ICON} {st.session_state.USER}**")
     
-    # 1. データの事前抽出（NameError防止のための初期設定）
-    today_logs = pd.DataFrame()
-    tomorrow_logs = pd.DataFrame()
+    # 3週間以内の予定（下の「一緒にのぼろー」で使う）
     t_0 = pd.Timestamp(today_jp)
-    t_1 = t_0 + timedelta(days=1)
-    
-    if not log_df.empty:
-        # 予定（type='予定'）だけを抽出
-        all_plans = log_df[log_df['type'] == '予定']
-        if not all_plans.empty:
-            today_logs = all_plans[all_plans['date'] == t_0]
-            tomorrow_logs = all_plans[all_plans['date'] == t_1]
-    
-    # 2. エリア情報のマージ
-    if not gym_df.empty and not area_master.empty:
-        merged_gyms = pd.merge(gym_df, area_master[['area_tag', 'major_area']], on='area_tag', how='left')
-    else:
-        merged_gyms = pd.DataFrame()
+    three_weeks_later = today_jp + timedelta(days=21)
     
     # 3. 登録フォーム
     st.markdown(
@@ -128,53 +135,23 @@ def show_page():
             label_visibility="collapsed"
         )
                 
-        # エリアの並び順定義
-        custom_order = ["都内・神奈川", "関東", "関西", "全国"]
-        
-        if not merged_gyms.empty:
-            actual_areas = [a for a in merged_gyms['major_area'].unique() if pd.notna(a)]
-            all_areas = [a for a in custom_order if a in actual_areas]
-            all_areas += [a for a in actual_areas if a not in custom_order]
-        else:
-            all_areas = ["未設定"]
-    
-        # --- ✨ ここを追加：直近1ヶ月の訪問実績をチェック ---
-        recent_gyms = []
-        if not log_df.empty:
-            # 30日前の日付を計算
-            one_month_ago = pd.Timestamp(today_jp) - timedelta(days=30)
-            # 自分の「実績」からジム名を抽出
-            recent_gyms = log_df[
-                (log_df['user'] == st.session_state.USER) & 
-                (log_df['type'] == '実績') & 
-                (log_df['date'] >= one_month_ago)
-            ]['gym_name'].unique().tolist()
+        # エリアタブとジムの選択肢（直近1ヶ月に行ったジムには⭐）。ジム・ログの世代ごとに1回だけ作る
+        one_month_ago = pd.Timestamp(today_jp) - timedelta(days=30)
+        gym_options = get_gym_options(st.session_state.USER, one_month_ago, "⭐")
+        all_areas = gym_options["areas"] or ["未設定"]
     
         area_tabs = st.tabs(all_areas)
         selected_gym = None
     
         for i, area in enumerate(all_areas):
             with area_tabs[i]:
-                # 元のジム名リストを取得
-                raw_area_gyms = sorted(merged_gyms[merged_gyms['major_area'] == area]['gym_name'].unique().tolist())
+                label_map = gym_options["options"].get(area, {})  # 表示名から元の名前を引く用
                 
-                if len(raw_area_gyms) > 0:
-                    # 💡 表示用ラベルの作成
-                    display_options = []
-                    label_map = {} # 表示名から元の名前を引く用
-                    
-                    for g_name in raw_area_gyms:
-                        if g_name in recent_gyms:
-                            label = f"{g_name} ⭐"
-                        else:
-                            label = f"{g_name}" # ズレ防止の全角スペース
-                        display_options.append(label)
-                        label_map[label] = g_name
-    
+                if len(label_map) > 0:
                     # ラジオボタン表示
                     res_label = st.radio(
                         f"{area}のジムを選択", 
-                        options=display_options,
+                        options=list(label_map),
                         index=None,
                         key=f"radio_top_{area}",
                         label_visibility="collapsed" 
@@ -242,65 +219,32 @@ def show_page():
     ''', unsafe_allow_html=True)
 
     # --- データの準備 ---
-    from datetime import timedelta
-    three_weeks_later = today_jp + timedelta(days=21)    
-    future_logs = log_df[
-        (log_df['type'] == '予定') & 
-        (log_df['date'].dt.date >= today_jp) & 
-        (log_df['date'].dt.date <= three_weeks_later)
-    ].copy()
-
-    if not future_logs.empty:
-        # 💡 時間帯（time_slot）を含めて集計するために、groupbyの構成を変更します
-        # 日付とジム名でグループ化
-        grouped_future = future_logs.groupby(['date', 'gym_name'])
-        sorted_keys = sorted(grouped_future.groups.keys())
+    # 予定・期間の絞り込みは _plan_feed の取得時に適用済み。集計はログの世代ごとに1回だけ
+    feed = _plan_feed(get_table_version("climbing_logs"), t_0, pd.Timestamp(three_weeks_later))
 
-        for d_ts, gym in sorted_keys:
-            # その「日・ジム」に該当する全ユーザー行を取得
-            day_gym_df = grouped_future.get_group((d_ts, gym))
-            d_val = d_ts.date()
-            
-            # --- 1. 時間帯ごとのアイコン画像＋文字列の定義 ---
-            icon_map = {
-                "昼": '<img src="https://github.com/kenta-yos/climbing-schedule-app/blob/develop/images/hiru.png?raw=true" width="16"/>',
-                "夕方": '<img src="https://github.com/kenta-yos/climbing-schedule-app/blob/develop/images/yuu.png?raw=true" width="16"/>',
-                "夜": '<img src="https://github.com/kenta-yos/climbing-schedule-app/blob/develop/images/yoru.png?raw=true" width="16"/>'
-            }
+    if feed:
+        profiles = get_user_profiles()
+        weekdays = ["月", "火", "水", "木", "金", "土", "日"]
+        cards = []
+        for item in feed:
+            d_val = item['date'].date()
 
-            # --- 2. 時間帯ごとにユーザーを振り分け ---
-            times = {"昼": [], "夕方": [], "夜": []}
-            others = [] # 時間帯が空（古いデータなど）用
-
-            for _, row in day_gym_df.iterrows():
-                u = row['user']
-                ts = row.get('time_slot')
-                
-                if pd.isna(ts) or ts == "" or ts not in times:
-                    if u not in others:
-                        others.append(u)
-                else:
-                    if u not in times[ts]:
-                        times[ts].append(u)
-
-            # --- 3. 時間帯ごとのユーザー名を横1行にまとめる ---
+            # --- 1. 時間帯ごとのユーザー名を横1行にまとめる ---
             time_strs = []
-            for ts in ["昼", "夕方", "夜"]:
-                if times[ts]:
-                    # 色付きユーザー名HTMLを取得
-                    user_htmls = [get_colored_user_text(u, user_df) for u in sorted(times[ts])]
+            for ts in TIME_SLOTS:
+                if item['slots'][ts]:
                     # アイコンラベル: ユーザーA & ユーザーB
-                    time_strs.append(f"{icon_map[ts]}  {' & '.join(user_htmls)}")
+                    user_htmls = format_user_names(item['slots'][ts], profiles)
+                    time_strs.append(f"{FEED_ICON_MAP[ts]}  {' & '.join(user_htmls)}")
 
             # 時間帯がないユーザーがいる場合、最後に追加（アイコンなしで名前だけ）
-            if others:
-                other_htmls = [get_colored_user_text(u, user_df) for u in sorted(others)]
-                time_strs.append(f"{' & '.join(other_htmls)}")
+            if item['others']:
+                time_strs.append(' & '.join(format_user_names(item['others'], profiles)))
 
             # "|" で区切って横並び表示用のHTMLを生成（空なら完全に詰まる）
             members_html = " | ".join(time_strs)
 
-            # --- 4. 日付の表示形式とアクセントカラー（既存ロジック） ---
+            # --- 2. 日付の表示形式とアクセントカラー（既存ロジック） ---
             if d_val == today_jp:
                 date_display = "Today"
                 accent_color = "#1E8449"   # 今日：緑
@@ -308,28 +252,21 @@ def show_page():
                 date_display = "Tomorrow"
                 accent_color = "#2E86DE"   # 明日：青
             else:
-                weekdays = ["月", "火", "水", "木", "金", "土", "日"]
-                d_str = d_val.strftime('%m/%d')
-                w_str = weekdays[d_val.weekday()]
-                date_display = f"{d_str}({w_str})"
+                date_display = f"{d_val.strftime('%m/%d')}({weekdays[d_val.weekday()]})"
                 accent_color = "#F36C21"   # 通常：オレンジ
 
-            # --- 5. 最終的なマークダウン出力 ---
-            st.markdown(f'''
-                <div style="margin-bottom: 8px; padding: 6px 12px; border-left: 4px solid {accent_color}; display: flex; align-items: flex-start;">
-                    <div style="min-width: 65px; font-size: 0.85rem; color: {accent_color}; font-weight: bold; margin-top: 2px; flex-shrink: 0;">
-                        {date_display}
-                    </div>
-                    <div style="flex-grow: 1; margin-left: 4px;">
-                        <div style="font-weight: bold; color: #333; font-size: 0.95rem; line-height: 1.2; margin-bottom: 2px;">
-                            {gym}
-                        </div>
-                        <div style="font-size: 0.85rem; line-height: 1.4;">
-                            {members_html}
-                        </div>
-                    </div>
-                </div>
-            ''', unsafe_allow_html=True)
+            cards.append(
+                f'<div style="margin-bottom: 8px; padding: 6px 12px; border-left: 4px solid {accent_color}; display: flex; align-items: flex-start;">'
+                f'<div style="min-width: 65px; font-size: 0.85rem; color: {accent_color}; font-weight: bold; margin-top: 2px; flex-shrink: 0;">{date_display}</div>'
+                '<div style="flex-grow: 1; margin-left: 4px;">'
+                f'<div style="font-weight: bold; color: #333; font-size: 0.95rem; line-height: 1.2; margin-bottom: 2px;">{item["gym_name"]}</div>'
+                f'<div style="font-size: 0.85rem; line-height: 1.4;">{members_html}</div>'
+                '</div>'
+                '</div>'
+            )
+
+        # --- 3. 全カードをまとめて1回で出力 ---
+        render_html_list(cards)
     else:
         st.caption("3週間以内に予定を入れている仲間はいません😭")
         
@@ -342,61 +279,32 @@ def show_page():
         </div>
     ''', unsafe_allow_html=True)
 
-# 今月の実績データを抽出
-    first_day_of_month = pd.Timestamp(today_jp.replace(day=1))
-    this_month_logs = log_df[(log_df['type'] == '実績') & (log_df['date'] >= first_day_of_month)] if not log_df.empty else pd.DataFrame()
-
-    # 1. 全ユーザーのベースリストを作成
-    # user_dfから全ユーザー名を取得して、初期値0回のデータフレームを作る
-    all_users_base = pd.DataFrame({'user': user_df['user_name'].unique()})
-    all_users_base['count'] = 0
-
-    # 2. 今月の実績がある人のカウントを取得
-    if not this_month_logs.empty:
-        actual_counts = this_month_logs['user'].value_counts().reset_index()
-        actual_counts.columns = ['user', 'actual_count']
-        
-        # ベースリストに実績をマージ
-        ranking = pd.merge(all_users_base, actual_counts, on='user', how='left')
-        # 実績がない(NaN)人は0にする
-        ranking['count'] = ranking['actual_count'].fillna(0).astype(int)
-    else:
-        ranking = all_users_base
+    # 今月の回数は月別集計から取得（全ユーザーを対象に、0回の人も含める）
+    # 同着を考慮した順位付け (回数が同じなら同じ順位)。実績・ユーザーの世代ごとに1回だけ作る
+    ranking = _ranking_view(
+        get_table_version("climbing_logs"), get_table_version("users"), today_jp.year, today_jp.month,
+    )
 
-    # 3. 同着を考慮した順位付け (回数が同じなら同じ順位)
-    ranking['rank_num'] = ranking['count'].rank(ascending=False, method='min').astype(int)
+    # 5. リスト表示（全員分をまとめて1回で描画）
+    # 1-3位ならメダル、それ以外（0回含む）は数字を表示
+    rank_display = ranking['rank_label']
     
-    # 4. ユーザー詳細（アイコン・色）をマージしてソート
-    ranking = pd.merge(ranking[['user', 'count', 'rank_num']], 
-                       user_df[['user_name', 'icon', 'color']], 
-                       left_on='user', right_on='user_name', how='left').sort_values(['rank_num', 'user'])
-
-    # 5. リスト表示のループ
-    for _, row in ranking.iterrows():
-        r = row['rank_num']
-        c = row['count']
-        
-        # 0回の人にはメダルを出さず、順位だけにする、などの調整も可能
-        # ここでは1-3位ならメダル、それ以外（0回含む）は数字を表示
-        medals = {1: "🥇", 2: "🥈", 3: "🥉"}
-        rank_display = medals.get(r, f"{r}位")
-        
-        # 1〜3位かつ1回以上登っている場合だけ背景に色をつける（0回で3位以内に入るのを防ぐ場合）
-        is_top = (r <= 3 and c > 0)
-        bg_color = "#fff9e6" if is_top else "#ffffff"
-        border_color = "#ffeaa7" if is_top else "#eeeeee"
-        
-        # 0回の人だけ少し文字を薄くする（お好みで）
-        text_opacity = "1.0" if c > 0 else "0.5"
-
-        st.markdown(f'''
-            <div style="display: flex; align-items: center; background: {bg_color}; padding: 10px 15px; 
-                        border-radius: 10px; border: 1px solid {border_color}; margin-bottom: 6px; opacity: {text_opacity};">
-                <div style="font-size: 1.2rem; min-width: 45px; font-weight: bold;">{rank_display}</div>
-                <div style="font-size: 1.3rem; margin-right: 12px;">{row['icon']}</div>
-                <div style="flex-grow: 1; font-weight: bold; color: #333; font-size: 1rem;">{row['user']}</div>
-                <div style="font-size: 1.2rem; font-weight: 800; color: {row['color']};">
-                    {c}<span style="font-size: 0.75rem; margin-left: 3px; color: #666;">回</span>
-                </div>
-            </div>
-        ''', unsafe_allow_html=True)
+    # 1〜3位かつ1回以上登っている場合だけ背景に色をつける（0回で3位以内に入るのを防ぐ）
+    bg_color = ranking['is_top'].map({True: "#fff9e6", False: "#ffffff"})
+    border_color = ranking['is_top'].map({True: "#ffeaa7", False: "#eeeeee"})
+    
+    # 0回の人だけ少し文字を薄くする
+    text_opacity = ranking['active'].map({True: "1.0", False: "0.5"})
+    
+    rows_html = (
+        '<div style="display: flex; align-items: center; background: ' + bg_color + '; padding: 10px 15px; '
+        'border-radius: 10px; border: 1px solid ' + border_color + '; margin-bottom: 6px; opacity: ' + text_opacity + ';">'
+        '<div style="font-size: 1.2rem; min-width: 45px; font-weight: bold;">' + rank_display + '</div>'
+        '<div style="font-size: 1.3rem; margin-right: 12px;">' + ranking['icon'].astype(str) + '</div>'
+        '<div style="flex-grow: 1; font-weight: bold; color: #333; font-size: 1rem;">' + ranking['user'].astype(str) + '</div>'
+        '<div style="font-size: 1.2rem; font-weight: 800; color: ' + ranking['color'].astype(str) + ';">'
+        + ranking['count'].astype(str) + '<span style="font-size: 0.75rem; margin-left: 3px; color: #666;">回</span>'
+        '</div>'
+        '</div>'
+    )
+    render_html_list(rows_html)
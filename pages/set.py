@@ -2,7 +2,8 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 # utils.py から必要な機能をインポート
-from utils import get_supabase_data, get_now_jp
+from utils import get_tables, get_schedule_month_index, get_now_jp, render_html_list
+from core.schedule_index import MONTH_LABEL
 
 def show_page():
     # --- 過ぎたスケジュールをグレー字に ---
@@ -20,9 +21,8 @@ def show_page():
     today_jp = now_jp.date()
     
     # データの取得
-    gym_df = get_supabase_data("gym_master")
-    sched_df = get_supabase_data("set_schedules")
-    area_master = get_supabase_data("area_master")
+    tables = get_tables(["gym_master", "set_schedules", "area_master"])
+    gym_df, sched_df, area_master = tables.gym_master, tables.set_schedules, tables.area_master
     
     # 未ログイン時のガード
     if st.session_state.USER is None:
@@ -33,45 +33,34 @@ def show_page():
     st.subheader("📅 セットスケジュール")
     
     if not sched_df.empty:
-        s_df = sched_df.copy()
-        
-        # 表示用の月リストを作成 (Timestamp型を考慮)
-        s_df['month_year'] = s_df['start_date'].dt.strftime('%Y年%m月')
-        months = sorted(s_df['month_year'].unique().tolist(), reverse=True)
+        # 月インデックス（データの世代ごとに1回だけ作られる。月をまたぐ予定は両方の月に入る）
+        month_index = get_schedule_month_index(sched_df)
+        months = [MONTH_LABEL.format(y, m) for y, m in month_index.months()]
         
         # 現在の月をデフォルト選択
         cur_m = datetime.now().strftime('%Y年%m月')
         sel_m = st.selectbox("表示月", options=months, index=months.index(cur_m) if cur_m in months else 0)
         
-        # 選択された月のデータを表示
-        target_month_df = s_df[s_df['month_year'] == sel_m].sort_values('start_date')
+        # 選択された月のデータを表示（インデックスから開始日順で取り出すだけ）
+        sel_y, sel_mo = map(int, sel_m.rstrip('月').split('年'))
+        target_month_df = month_index.rows(sel_y, sel_mo)
+        
+        # 表示用の列をまとめて作成
+        d_s = target_month_df['start_date'].dt.strftime('%m/%d')
+        d_e = target_month_df['end_date'].dt.strftime('%m/%d')
+        d_disp = d_s.where(d_s == d_e, d_s + "-" + d_e)
+        # 日付の比較用に date 型（当日0時）で比較
+        past_cls = (target_month_df['end_date'].dt.normalize() < pd.Timestamp(today_jp)).map({True: "past-opacity", False: ""})
         
-        for _, row in target_month_df.iterrows():
-            # 日付の比較用に date 型に変換
-            is_past = row['end_date'].date() < today_jp
-            
-            # 表示用の日付文字列を作成
-            d_s = row['start_date'].strftime('%m/%d')
-            d_e = row['end_date'].strftime('%m/%d')
-            d_disp = d_s if d_s == d_e else f"{d_s}-{d_e}"
-            
-            # レイアウト崩れ防止：HTML構造を整理
-            st.markdown(f'''
-                <a href="{row["post_url"]}" target="_blank" style="text-decoration: none;">
-                    <div class="set-box {"past-opacity" if is_past else ""}" style="
-                        display: grid;
-                        grid-template-columns: 4px 105px 1fr;
-                        align-items: center;
-                        gap: 12px;
-                        padding: 15px 5px;
-                        border-bottom: 1px solid #F0F0F0;
-                        width: 100%;
-                    ">
-                        <div class="item-accent" style="background:#B22222 !important; width: 4px; height: 1.4rem; border-radius: 2px;"></div>
-                        <span class="item-date" style="color: #B22222; font-weight: 700; font-size: 0.85rem; white-space: nowrap;">{d_disp}</span>
-                        <span class="item-gym" style="color: #1DA1F2; font-weight: 700; font-size: 0.95rem;">{row["gym_name"]}</span>
-                    </div>
-                </a>
-            ''', unsafe_allow_html=True)
+        # レイアウト崩れ防止：HTML構造を整理（1行ずつではなく全行まとめて描画）
+        rows_html = (
+            '<a href="' + target_month_df['post_url'].astype(str) + '" target="_blank" style="text-decoration: none;">'
+            '<div class="set-box ' + past_cls + '" style="display: grid; grid-template-columns: 4px 105px 1fr; align-items: center; gap: 12px; padding: 15px 5px; border-bottom: 1px solid #F0F0F0; width: 100%;">'
+            '<div class="item-accent" style="background:#B22222 !important; width: 4px; height: 1.4rem; border-radius: 2px;"></div>'
+            '<span class="item-date" style="color: #B22222; font-weight: 700; font-size: 0.85rem; white-space: nowrap;">' + d_disp + '</span>'
+            '<span class="item-gym" style="color: #1DA1F2; font-weight: 700; font-size: 0.95rem;">' + target_month_df['gym_name'].astype(str) + '</span>'
+            '</div></a>'
+        )
+        render_html_list(rows_html, page_size=30, key=f"set_list_page_{sel_m}")
     else:
         st.info("セットスケジュールが登録されていません。")
@@ -0,0 +1,104 @@
+import re
+from dataclasses import dataclass
+from datetime import date, datetime
+
+# セット関連の投稿かどうかの判定キーワード
+KEYWORDS = ["セット", "ホールド", "全面", "完了", "set", "change", "new"]
+_KEYWORD_RE = re.compile("|".join(map(re.escape, KEYWORDS)), re.IGNORECASE)
+
+# 日付: 3/10, 3.10, 3月10日, 3/10(火) など
+_DATE = r"(?P<{p}m>\d{{1,2}})\s*[/月\.]\s*(?P<{p}d>\d{{1,2}})\s*日?"
+_WEEKDAY = r"(?:\s*[\(（][月火水木金土日祝・]+[\)）])?"
+_RANGE_SEP = r"\s*(?:〜|~|～|－|-|ー|−|から)\s*"
+# 範囲の終わりは「3/12」「12日」「12」のどれか
+_RANGE_END = r"(?:" + _DATE.format(p="e") + r"|(?P<eday>\d{1,2})\s*日?)"
+
+# 日付（と範囲の終わり）をまとめて1本の正規表現にしてコンパイルしておく
+_SCHEDULE_RE = re.compile(
+    r"(?<![\d/.])(?:(?P<sy>\d{4})\s*[/年\.]\s*)?" + _DATE.format(p="s") + _WEEKDAY
+    + r"(?:" + _RANGE_SEP + _RANGE_END + _WEEKDAY + r")?(?![\d/])"
+)
+
+# 「M月D日」形式や、キーワードと日付が近い場合は確度を上げる
+_NEAR = 30
+
+
+@dataclass(frozen=True)
+class ScheduleDate:
+    caption_index: int   # 入力リストの何番目のキャプションか
+    start: date
+    end: date
+    confidence: float    # 0〜1（キーワードなしの日付は低め）
+
+
+def _resolve_year(month, day, today):
+    # 今日に一番近い年を採用（12月の投稿の「1/5」は翌年、1月の投稿の「12/28」は前年）
+    best = None
+    for year in (today.year - 1, today.year, today.year + 1):
+        try:
+            d = date(year, month, day)
+        except ValueError:
+            continue
+        if best is None or abs((d - today).days) < abs((best - today).days):
+            best = d
+    return best
+
+
+def _end_date(start, month, day):
+    # 範囲の終わりが開始より前なら年をまたいでいる（12/30〜1/2）
+    year = start.year
+    try:
+        end = date(year, month, day)
+        if end < start:
+            end = date(year + 1, month, day)
+    except ValueError:
+        return None
+    return end
+
+
+def parse_captions(captions, today=None, min_confidence=0.0):
+    """
+    複数のキャプションからセット日をまとめて抽出する。
+    1つのキャプションに日付が複数あれば全部、範囲（3/10〜3/12, 3/10-12）は開始と終了を返す。
+    戻り値: ScheduleDate のリスト（min_confidence 未満は除く）
+    """
+    if today is None:
+        today = datetime.now().date()
+    elif isinstance(today, datetime):
+        today = today.date()
+
+    results = []
+    for i, text in enumerate(captions):
+        if not text:
+            continue
+        keyword_pos = [m.start() for m in _KEYWORD_RE.finditer(text)]
+        for m in _SCHEDULE_RE.finditer(text):
+            if m['sy']:
+                try:
+                    start = date(int(m['sy']), int(m['sm']), int(m['sd']))
+                except ValueError:
+                    continue
+            else:
+                start = _resolve_year(int(m['sm']), int(m['sd']), today)
+                if start is None:
+                    continue
+            end = start
+            if m['em']:
+                end = _end_date(start, int(m['em']), int(m['ed']))
+            elif m['eday']:
+                end = _end_date(start, start.month, int(m['eday']))
+            if end is None or (end - start).days > 31:
+                # 範囲として不自然なものは開始日だけ採用
+                end = start
+
+            if not keyword_pos:
+                confidence = 0.2
+            else:
+                confidence = 0.6
+                if any(abs(p - m.start()) <= _NEAR for p in keyword_pos):
+                    confidence += 0.2
+                if "月" in m.group(0):
+                    confidence += 0.2
+            if confidence >= min_confidence:
+                results.append(ScheduleDate(i, start, end, round(confidence, 2)))
+    return results
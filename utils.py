@@ -1,8 +1,21 @@
+import os
 import streamlit as st
 import pandas as pd
 import pytz
+from dataclasses import dataclass, field
 from datetime import datetime
+from functools import lru_cache, partial
 from st_supabase_connection import SupabaseConnection
+from core.table_mirror import TableMirror, normalize_frame
+from core.local_store import LocalStore
+from core.write_queue import WriteQueue
+from core.schema import select_columns
+from core.snapshot import SnapshotStore
+from core.schedule_index import ScheduleMonthIndex, GymScheduleIndex
+from core import profiler
+from core.views import build_gym_options
+from core.visit_index import VisitIndex
+from core.monthly_ranking import MonthlyRanking
 
 # --- 日本時間の定義 ---
 jp_timezone = pytz.timezone('Asia/Tokyo')
@@ -14,28 +27,305 @@ def get_now_jp():
 def init_connection():
     return st.connection("supabase", type=SupabaseConnection)
 
+# Supabase(PostgREST)は1リクエストあたりの返却行数に上限があるのでページングして取る
+# ページごとの範囲がずれないよう、クエリには必ず並び順（最後に id）を付けること
+PAGE_SIZE = 1000
+
+def _paged(build_query):
+    # build_query はページごとに新しいクエリビルダーを返す関数
+    rows, start = [], 0
+    while True:
+        res = build_query().range(start, start + PAGE_SIZE - 1).execute()
+        rows.extend(res.data or [])
+        if not res.data or len(res.data) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+def _fetch_rows(name, since_id=None):
+    conn = init_connection()
+    if since_id is None:
+        return _paged(lambda: conn.table(name).select(select_columns(name)).order("id"))
+    return _paged(lambda: conn.table(name).select(select_columns(name)).gt("id", since_id).order("id"))
+
+def _fetch_ids(name):
+    conn = init_connection()
+    return [r['id'] for r in _paged(lambda: conn.table(name).select("id").order("id"))]
+
+def _fetch_by_ids(name, ids):
+    # id は URL のクエリに並ぶので、長くなりすぎないよう分けて取る
+    conn = init_connection()
+    rows = []
+    for i in range(0, len(ids), PAGE_SIZE // 5):
+        chunk = [int(x) for x in ids[i:i + PAGE_SIZE // 5]]
+        rows.extend(conn.table(name).select(select_columns(name)).in_("id", chunk).order("id").execute().data or [])
+    return rows
+
+# --- データの置き場所 ---
+# 環境変数 DATA_BACKEND で切り替える
+#   supabase（既定）: Supabase だけ
+#   sqlite: Supabase + ローカルのSQLiteミラー。条件付き取得は手元のSQLで行い、書き込みは Supabase に書いてから反映する
+#   local: SQLite だけ（Supabase なしで動かす。動作確認・ベンチマーク用）
+DATA_BACKEND = os.environ.get("DATA_BACKEND", "supabase")
+LOCAL_DB_PATH = os.environ.get("LOCAL_DB_PATH", ".local_mirror.db")
+TABLES = ("gym_master", "set_schedules", "climbing_logs", "users", "area_master")
+
+@st.cache_resource
+def get_local_store():
+    """ローカルのSQLiteミラー（DATA_BACKEND が supabase のときは None）"""
+    if DATA_BACKEND == "supabase":
+        return None
+    return LocalStore(LOCAL_DB_PATH)
+
+# キャッシュから外れたら（cache_resource.clear() など）バックグラウンドのスレッドを止める
+@st.cache_resource(on_release=TableMirror.close)
+def get_table_mirror():
+    # プロセス全体で1つ。全セッションがこのミラーを共有する
+    # よく読まれるテーブルはバックグラウンドで先に同期しておき、画面の描画では通信を待たない
+    store = get_local_store()
+    if DATA_BACKEND == "local":
+        mirror = TableMirror(
+            store.fetch_rows, store.fetch_ids, ttl=10, reconcile_interval=60, fetch_by_ids=store.fetch_by_ids,
+        )
+    else:
+        # sqlite のときは前回の控えから起動して差分だけ取り、以降の増減も控えに書き込む
+        mirror = TableMirror(
+            _fetch_rows, _fetch_ids, ttl=10, reconcile_interval=60,
+            seed=store.load if store is not None else None, fetch_by_ids=_fetch_by_ids,
+        )
+        if store is not None:
+            for name in TABLES:
+                mirror.subscribe(name, store.listener(name))
+    mirror.start_refresher()
+    return mirror
+
+def insert_rows(table, records):
+    """DATA_BACKEND の置き場所に行を追加して、追加した行（採番された id つき）を返す"""
+    if DATA_BACKEND == "local":
+        return get_local_store().insert(table, records)
+    return init_connection().table(table).insert(records).execute().data
+
+def delete_rows(table, ids):
+    """DATA_BACKEND の置き場所から id の行を削除する"""
+    if DATA_BACKEND == "local":
+        get_local_store().delete(table, ids)
+    else:
+        init_connection().table(table).delete().in_("id", list(ids)).execute()
+
+def get_table_version(table_name):
+    # キャッシュの世代番号。派生データのキャッシュキーに使う
+    # 手元にあるテーブル（と、ローカルの控えを使うときは全テーブル）は先に同期しておく
+    # （キーを読んだあとに同期で世代が進むと、次の再実行でキャッシュが外れる）
+    mirror = get_table_mirror()
+    if get_local_store() is not None or mirror.loaded(table_name):
+        mirror.get(table_name)
+    return mirror.version(table_name)
+
 def get_supabase_data(table_name):
-    @st.cache_data(ttl=10)
-    def _read(name):
-        conn = init_connection()
-        try:
-            res = conn.table(name).select("*").execute()
-            if not res.data: return pd.DataFrame()
-            df = pd.DataFrame(res.data)
-            date_cols = ['date', 'start_date', 'end_date', 'created_at']
-            for col in date_cols:
-                if col in df.columns:
-                    df[col] = pd.to_datetime(df[col]).dt.tz_localize(None)
-            return df
-        except Exception as e:
-            st.error(f"Error reading {name}: {e}")
-            return pd.DataFrame()
-    return _read(table_name)
+    try:
+        with profiler.stage(f"get:{table_name}", "fetch") as s:
+            df = get_table_mirror().get(table_name)
+            s.rows = len(df)
+        return df
+    except Exception as e:
+        st.error(f"Error reading {table_name}: {e}")
+        return pd.DataFrame()
+
+@dataclass(frozen=True)
+class Tables:
+    """get_tables の戻り値。要求しなかったテーブルは空のDataFrame"""
+    gym_master: pd.DataFrame = field(default_factory=pd.DataFrame)
+    set_schedules: pd.DataFrame = field(default_factory=pd.DataFrame)
+    climbing_logs: pd.DataFrame = field(default_factory=pd.DataFrame)
+    users: pd.DataFrame = field(default_factory=pd.DataFrame)
+    area_master: pd.DataFrame = field(default_factory=pd.DataFrame)
+
+@st.cache_resource
+def get_snapshot_store():
+    # 全セッション共有。インデックスはスナップショット（ミラーのフレーム）ごとに1回だけ作る
+    store = SnapshotStore()
+    store.register_index("set_schedules", "months", ScheduleMonthIndex)
+    store.register_index("set_schedules", "gym_intervals", GymScheduleIndex)
+    return store
+
+def get_tables(table_names):
+    """
+    ページの最初に使うテーブルをまとめて取得する（未取得のものは並列に取りに行く）。
+    返すのは全セッション共有の読み取り専用スナップショットなので、書き換えずに使うこと。
+    例: t = get_tables(["gym_master", "set_schedules"]); t.gym_master
+    """
+    tables = {}
+    with profiler.stage("get_tables:" + ",".join(table_names), "fetch") as s:
+        results = get_table_mirror().get_many(table_names)
+        s.rows = sum(len(r) for r in results.values() if not isinstance(r, Exception))
+    for name, result in results.items():
+        if isinstance(result, Exception):
+            st.error(f"Error reading {name}: {result}")
+            result = pd.DataFrame()
+        tables[name] = result
+    return Tables(**tables)
+
+def get_schedule_month_index(sched_df):
+    """get_tables で取った set_schedules に対応する月インデックス（世代ごとに1回だけ作る）"""
+    return get_snapshot_store().index("set_schedules", "months", sched_df)
+
+def get_gym_schedule_index(sched_df):
+    """get_tables で取った set_schedules に対応するジムごとのセット期間インデックス"""
+    return get_snapshot_store().index("set_schedules", "gym_intervals", sched_df)
+
+# --- ジム選択の選択肢（トップ・管理で共通） ---
+@st.cache_data(ttl=60, max_entries=32, show_spinner=False)
+def _gym_options(gym_version, area_version, log_version, user, since, mark):
+    # *_version はキャッシュキー専用（ジム・エリア・ログが変わると作り直しになる）
+    tables = get_tables(["gym_master", "area_master"])
+    recent_gyms = get_visit_index().gyms_since(user, since)
+    return build_gym_options(tables.gym_master, tables.area_master, recent_gyms, mark)
+
+def get_gym_options(user, since, mark):
+    """エリアタブと {表示ラベル: ジム名}。since 以降に行ったジムには mark を付ける"""
+    get_tables(["gym_master", "area_master", "climbing_logs"])  # ロード・同期してから世代をキーにする
+    return _gym_options(
+        get_table_version("gym_master"), get_table_version("area_master"),
+        get_table_version("climbing_logs"), user, pd.Timestamp(since), mark,
+    )
+
+# --- 訪問インデックス（ユーザー×ジムの最終訪問日など） ---
+@st.cache_resource
+def _visit_index():
+    index = VisitIndex()
+    get_table_mirror().subscribe("climbing_logs", index)
+    return index
+
+def get_visit_index():
+    # ミラーを最新化してから返す（増減はリスナー経由でインデックスに反映済み）
+    get_supabase_data("climbing_logs")
+    return _visit_index()
+
+# --- 月別ランキング集計（年月×ユーザーの実績回数） ---
+@st.cache_resource
+def _monthly_ranking():
+    ranking = MonthlyRanking()
+    get_table_mirror().subscribe("climbing_logs", ranking)
+    return ranking
+
+def get_monthly_ranking():
+    get_supabase_data("climbing_logs")
+    return _monthly_ranking()
+
+# --- 条件付き取得（絞り込みをSupabase側で行う） ---
+def _to_param(v):
+    # 日付はISO文字列にしてから渡す
+    return v.isoformat() if hasattr(v, 'isoformat') else v
+
+def _freeze(pred):
+    # キャッシュキーにするため dict を並び順の決まったタプルにする
+    return tuple(sorted((k, _to_param(v)) for k, v in (pred or {}).items()))
+
+@st.cache_data(ttl=10)
+def _query(name, columns, eq, neq, gte, lte, order, version):
+    # version はキャッシュキー専用（safe_save で書き込むと世代が進んで取り直しになる）
+    profiler.count("query_cache_miss")  # ここに来るのはキャッシュにないときだけ
+    store = get_local_store()
+    if store is not None:
+        # ローカルのミラーに対してSQLで絞り込む（ミラーは呼び出し側で最新化済み）
+        return store.query(name, columns, eq, neq, gte, lte, order)
+    mirror = get_table_mirror()
+    if mirror.loaded(name):
+        # 手元にあるテーブルは手元で絞り込む（保存直後の仮の行も含めて、通信なしで返せる）
+        return mirror.query(name, columns, eq, neq, gte, lte, order)
+    conn = init_connection()
+    def build():
+        q = conn.table(name).select(",".join(columns) if columns else select_columns(name))
+        for col, v in eq:
+            q = q.eq(col, v)
+        for col, v in neq:
+            q = q.neq(col, v)
+        for col, v in gte:
+            q = q.gte(col, v)
+        for col, v in lte:
+            q = q.lte(col, v)
+        if order:
+            q = q.order(order)
+        # 同じ値の行の順番もページ間で揃うように id で並べる
+        return q.order("id")
+    return normalize_frame(_paged(build), name)
+
+def query_supabase_data(table_name, columns=None, eq=None, neq=None, gte=None, lte=None, order=None):
+    """
+    条件に合う行だけを取得する。
+    eq/neq/gte/lte は {カラム名: 値} の dict、columns は取得するカラムのリスト。
+    例: query_supabase_data("climbing_logs", columns=["user", "date"], eq={"type": "予定"}, gte={"date": today})
+    """
+    try:
+        profiler.count("query")
+        with profiler.stage(f"query:{table_name}", "fetch") as s:
+            # get_table_version が手元のコピー（ローカルの控え）を最新化してから世代を返す
+            df = _query(
+                table_name, tuple(columns or ()), _freeze(eq), _freeze(neq),
+                _freeze(gte), _freeze(lte), order, get_table_version(table_name),
+            )
+            s.rows = len(df)
+        return df
+    except Exception as e:
+        st.error(f"Error reading {table_name}: {e}")
+        return pd.DataFrame()
+
+@st.cache_data(ttl=10)
+def _has_rows(name, version):
+    # version はキャッシュキー専用
+    store = get_local_store()
+    if store is not None:
+        return not store.query(name, columns=("id",)).empty
+    mirror = get_table_mirror()
+    if mirror.loaded(name):
+        return not mirror.get(name).empty
+    return bool(init_connection().table(name).select("id").limit(1).execute().data)
+
+def table_has_rows(table_name):
+    """テーブルに1行でもあるか（空のテーブルと、条件に合う行がないだけの場合を見分ける用）"""
+    try:
+        return _has_rows(table_name, get_table_version(table_name))
+    except Exception as e:
+        st.error(f"Error reading {table_name}: {e}")
+        return False
+
+# --- 書き込みキュー（書き込みはまとめてバックグラウンドで実行する） ---
+# 手元にないテーブルへの書き込みで、safe_save が完了を待つ最長時間。
+# これを過ぎたら完了を待たずに画面に戻る（書き込みは裏で続く）
+ACK_TIMEOUT = 1.0
+
+# 外れるときは溜まっている書き込みを ACK_TIMEOUT まで待ってからワーカーを止める（残りはそのまま書き終える）
+@st.cache_resource(on_release=lambda queue: queue.close(ACK_TIMEOUT))
+def get_write_queue():
+    # プロセス全体で1つ。全セッションの書き込みを同じキューでまとめる
+    return WriteQueue(insert_rows, delete_rows)
+
+def _confirm_insert(mirror, table, provisional_ids, pending):
+    # 書き込みキューのワーカーから呼ばれる。書き込んだテーブルだけを更新（他のテーブルのキャッシュは温存）
+    if pending.error is not None:
+        # サーバーに拒否されたら、先に反映した仮の行を取り消す
+        if provisional_ids:
+            mirror.apply_delete(table, provisional_ids)
+    elif provisional_ids:
+        mirror.confirm_insert(table, provisional_ids, pending.result or [])
+    elif pending.result:
+        mirror.apply_insert(table, pending.result)
+    else:
+        mirror.mark_stale(table)
+
+def _confirm_delete(mirror, table, removed, pending):
+    mirror.finish_delete(table, pending.payload)
+    if pending.error is not None:
+        # サーバーに拒否されたら、先に取り除いた行を戻す
+        mirror.restore(table, removed)
+    elif removed is None:
+        mirror.apply_delete(table, pending.payload)
 
 # --- 保存・削除処理 (target_tabとrerunを追加) ---
 def safe_save(table: str, data_input, mode: str = "add", target_tab: str = None):
-    conn = init_connection()
     try:
+        mirror = get_table_mirror()
+        queue = get_write_queue()
+        pending, applied = None, False
         if mode == "add":
             if not data_input.empty:
                 data_to_insert = data_input.to_dict(orient="records")
@@ -43,12 +333,38 @@ def safe_save(table: str, data_input, mode: str = "add", target_tab: str = None)
                     for key in ['date', 'start_date', 'end_date']:
                         if key in d and hasattr(d[key], 'isoformat'):
                             d[key] = d[key].isoformat()
-                conn.table(table).insert(data_to_insert).execute()
+                # 手元のテーブル（と派生インデックス）に仮の行として先に反映してから、書き込みをキューに入れる
+                provisional_ids = mirror.apply_provisional(table, data_to_insert)
+                applied = provisional_ids is not None
+                pending = queue.insert(table, data_to_insert)
+                pending.add_done_callback(partial(_confirm_insert, mirror, table, provisional_ids))
         elif mode == "delete":
             # deleteの場合はidが直接渡される想定
-            conn.table(table).delete().eq("id", data_input).execute()
+            data_input = int(data_input)
+            if data_input < 0:
+                # 保存中（仮の id）の行は、書き込みが終わって本物の id が決まってから消す
+                queue.flush(ACK_TIMEOUT)
+                data_input = mirror.resolve_id(data_input)
+                if data_input is None:
+                    raise RuntimeError("まだ保存中です。少し待ってからもう一度削除してね")
+            removed = mirror.apply_delete(table, [data_input], in_flight=True)
+            applied = removed is not None
+            pending = queue.delete(table, [data_input])
+            pending.add_done_callback(partial(_confirm_delete, mirror, table, removed))
+        
+        # 手元に反映済みなら完了を待たずに画面に戻る（rerun でも通信しない）。
+        # 手元にないテーブルのときだけ、少し待ってから戻る（普段は1回の通信で終わる）。
+        # local は条件付き取得がSQLite（書き込み先そのもの）を読むので待つ（手元への書き込みなのですぐ終わる）
+        if DATA_BACKEND == "local":
+            applied = False
+        if pending is not None:
+            if pending.wait(0 if applied else ACK_TIMEOUT):
+                if pending.error is not None:
+                    raise pending.error
+            else:
+                # 結果は次の画面表示で check_pending_writes が知らせる
+                st.session_state.setdefault("pending_writes", []).append(pending)
         
-        st.cache_data.clear()
         st.session_state.toast_msg = "登録したよ🚀" if mode == "add" else "削除したよ🙆‍♂️"
         
         # --- リダイレクト処理：ログイン画面に戻るのを防ぐ ---
@@ -68,16 +384,122 @@ def safe_save(table: str, data_input, mode: str = "add", target_tab: str = None)
         st.error(f"⚠️ エラー: {e}")
         return False
 
+def check_pending_writes():
+    """safe_save で完了を待たずに戻った書き込みのうち、裏で失敗したものを知らせる"""
+    pendings = st.session_state.get("pending_writes")
+    if not pendings:
+        return
+    for p in [p for p in pendings if p.done()]:
+        pendings.remove(p)
+        if p.error is not None:
+            st.error(f"⚠️ 保存できませんでした（{p.table}）: {p.error}")
+
+# --- セットスケジュールの一括登録（クローラー等の画面なし処理用） ---
+SCHEDULE_KEY = ['gym_name', 'start_date', 'end_date']
+
+def _schedule_keys(df):
+    # 日付の表記ゆれ（文字列/Timestamp/時刻つき）を吸収して比較用のキーにする
+    keys = df[SCHEDULE_KEY].copy()
+    for col in ['start_date', 'end_date']:
+        keys[col] = pd.to_datetime(keys[col], format='ISO8601').dt.strftime('%Y-%m-%d')
+    return list(keys.itertuples(index=False, name=None))
+
+def bulk_upsert_set_schedules(df, chunk_size=500):
+    """
+    (gym_name, start_date, end_date) が未登録の行だけを chunk_size 件ずつ追加する。
+    safe_save と違って st.rerun() も画面表示もしないので、Streamlit の外からも呼べる。
+    戻り値: 追加した件数（失敗時は例外をそのまま投げる）
+    """
+    if df.empty:
+        return 0
+    df = df.assign(_key=_schedule_keys(df)).drop_duplicates('_key')
+
+    # 対象ジムの登録済みキーだけを取得して突き合わせる
+    gyms = df['gym_name'].unique().tolist()
+    if DATA_BACKEND == "local":
+        existing = get_local_store().query("set_schedules", SCHEDULE_KEY, isin=(("gym_name", gyms),)).to_dict("records")
+    else:
+        conn = init_connection()
+        existing = _paged(
+            lambda: conn.table("set_schedules").select(",".join(SCHEDULE_KEY)).in_("gym_name", gyms).order("id")
+        )
+    existing_keys = set(_schedule_keys(pd.DataFrame(existing, columns=SCHEDULE_KEY))) if existing else set()
+    new_df = df[~df['_key'].isin(existing_keys)].drop(columns='_key')
+
+    records = new_df.to_dict(orient="records")
+    for d in records:
+        for key in ['start_date', 'end_date']:
+            if hasattr(d[key], 'isoformat'):
+                d[key] = d[key].isoformat()
+    # 書き込みキュー経由で（一時的な失敗はやり直す）。全部終わるまで待つ
+    mirror, queue = get_table_mirror(), get_write_queue()
+    pendings = [
+        queue.insert("set_schedules", records[i:i + chunk_size])
+        for i in range(0, len(records), chunk_size)
+    ]
+    for p in pendings:
+        p.add_done_callback(partial(_confirm_insert, mirror, "set_schedules", None))
+    for p in pendings:
+        p.wait()
+        if p.error is not None:
+            raise p.error
+    return len(records)
+
 # --- ユーザー表示ヘルパー ---
-def get_colored_user_text(user_name, user_df):
-    u_color, u_icon = "#555555", "👤"
-    if user_df is not None and not user_df.empty:
-        match = user_df[user_df['user_name'] == user_name]
-        if not match.empty:
-            u_color = match.iloc[0]['color']
-            u_icon = match.iloc[0]['icon']
-    style = f"color: {u_color}; font-weight: 800; text-shadow: 1px 1px 0px #fff, -1px -1px 0px #fff, 1px -1px 0px #fff, -1px 1px 0px #fff; padding: 0 2px;"
-    return f'<span style="{style}">{u_icon}{user_name}</span>'
+DEFAULT_USER_COLOR, DEFAULT_USER_ICON = "#555555", "👤"
+
+@st.cache_resource(max_entries=2)
+def _user_profiles(version):
+    # version（usersテーブルの世代）ごとに1回だけ作る
+    user_df = get_supabase_data("users")
+    if user_df.empty:
+        return {}
+    return {
+        name: (color, icon)
+        for name, color, icon in zip(user_df['user_name'], user_df['color'], user_df['icon'])
+    }
+
+def get_user_profiles():
+    """user_name -> (color, icon) の辞書"""
+    get_supabase_data("users")  # 世代を最新化してからキーにする
+    return _user_profiles(get_table_version("users"))
+
+@lru_cache(maxsize=1024)
+def _user_span(user_name, color, icon):
+    style = f"color: {color}; font-weight: 800; text-shadow: 1px 1px 0px #fff, -1px -1px 0px #fff, 1px -1px 0px #fff, -1px 1px 0px #fff; padding: 0 2px;"
+    return f'<span style="{style}">{icon}{user_name}</span>'
+
+def format_user_names(user_names, profiles=None):
+    """複数のユーザー名をまとめて色付きHTMLに変換する"""
+    if profiles is None:
+        profiles = get_user_profiles()
+    default = (DEFAULT_USER_COLOR, DEFAULT_USER_ICON)
+    return [_user_span(u, *profiles.get(u, default)) for u in user_names]
+
+def get_colored_user_text(user_name, user_df=None):
+    # user_df は以前の呼び出し方との互換のために残している（プロフィールは辞書から引く）
+    return format_user_names([user_name])[0]
+
+# --- リスト表示（まとめて1回の st.markdown で描画） ---
+def render_html_list(rows_html, page_size=None, key=None):
+    """
+    1行ぶんのHTML文字列の並び（list や Series）を連結して、1つの要素として描画する。
+    page_size を超える場合はページ送りを付けて、そのページの行だけを描画する。
+    """
+    rows = list(rows_html)
+    box = st.container()
+    if page_size and len(rows) > page_size:
+        n_pages = -(-len(rows) // page_size)
+        page = st.number_input(
+            f"ページ (全{n_pages}ページ / {len(rows)}件)", min_value=1, max_value=n_pages,
+            value=1, step=1, key=key,
+        )
+        rows = rows[(page - 1) * page_size: page * page_size]
+    # 行の間に改行を入れるとMarkdownとして解釈されてしまうので1行に連結する
+    with box, profiler.stage(f"render_html_list:{key or ''}", "render") as s:
+        st.markdown(f"<div>{''.join(rows)}</div>", unsafe_allow_html=True)
+        s.rows = len(rows)
+    profiler.count("elements")
 
 # --- 共通スタイル ---
 def apply_common_style():